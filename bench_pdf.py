@@ -0,0 +1,67 @@
+"""
+Resume PDF extraction: the old page-by-page loop vs pdftext (parallel, cached).
+
+    python bench_pdf.py [corpus_dir] [repeat]
+
+corpus_dir holds sample PDFs (default: sample_pdfs/). The cached column needs
+Redis; if it is down that column just repeats the uncached cost.
+"""
+import io
+import os
+import sys
+import glob
+import time
+
+import PyPDF2
+import numpy as np
+
+from pdftext import extract_pdf_text, PDF_MAX_BYTES
+
+
+def legacy_extract(data):
+    """extractresume.extract_text_from_pdf as it was (kept here for comparison)."""
+    pdf = PyPDF2.PdfReader(io.BytesIO(data))
+    text = ""
+    for pg in pdf.pages:
+        text += pg.extract_text() or ""
+    return text.strip()
+
+
+def timed(fn, data, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)) * 1000
+
+
+def main():
+    corpus = sys.argv[1] if len(sys.argv) > 1 else "sample_pdfs"
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    paths = sorted(glob.glob(os.path.join(corpus, "*.pdf")))
+    if not paths:
+        sys.exit(f"no PDFs in {corpus}/")
+
+    extract_pdf_text(open(paths[0], "rb").read(), use_cache=False)   # start the process pool
+
+    print(f"{'file':32} {'pages':>5} {'legacy ms':>10} {'parallel ms':>12} {'cached ms':>10}")
+    totals = np.zeros(3)
+    for path in paths:
+        data = open(path, "rb").read()
+        if len(data) > PDF_MAX_BYTES:
+            print(f"{os.path.basename(path)[:32]:32} skipped (over PDF_MAX_BYTES)")
+            continue
+        pages = len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+        row = np.array([
+            timed(legacy_extract, data, repeat),
+            timed(lambda d: extract_pdf_text(d, use_cache=False), data, repeat),
+            (extract_pdf_text(data), timed(extract_pdf_text, data, repeat))[1],
+        ])
+        totals += row
+        print(f"{os.path.basename(path)[:32]:32} {pages:5d} {row[0]:10.1f} {row[1]:12.1f} {row[2]:10.2f}")
+    print(f"{'total':32} {'':5} {totals[0]:10.1f} {totals[1]:12.1f} {totals[2]:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Microbenchmark: precompiled phoneme tokenizer vs the old per-character scan.
+
+    python bench_phonemes.py [repeat]
+
+Works on a canned IPA answer so espeak is not needed.
+"""
+import sys
+import timeit
+
+from getphenome import MULTI_CHAR_PHONEMES, split_phonemes, split_phonemes_batch, PUNCTUATION_PATTERN
+
+# ~ a 60-second spoken answer, already phonemized
+SAMPLE_IPA = (
+    "aɪ juːzd spɹɪŋ buːt tə bɪld ðə ɹɛst ɛndpɔɪnts, ænd aɪ kənfɪɡjɚd ðə dʒeɪpiːeɪ ɹɛpəzɪtɔɹiz "
+    "wɪð hɪbɚneɪt. wiː ædɪd ɹɛdɪs kæʃɪŋ fɔɹ ðə hɒt ɹiːdz ænd kæfkə fɔɹ ðə ɔːdɚ ɪvɛnts; "
+    "ðə sɜːvɪs skeɪld tə ə θaʊzənd ɹɪkwɛsts pɚ sɛkənd ɑːftɚ wiː tjuːnd ðə kənɛkʃən puːl. "
+) * 20
+
+
+def legacy_split(ipa_str):
+    """The tokenizer as it was before PHONEME_PATTERN (kept here for comparison)."""
+    words = PUNCTUATION_PATTERN.sub('', ipa_str).split()
+    phonemes = []
+    for word in words:
+        i = 0
+        while i < len(word):
+            matched = False
+            for m in sorted(MULTI_CHAR_PHONEMES, key=len, reverse=True):
+                if word[i:i + len(m)] == m:
+                    phonemes.append(m)
+                    i += len(m)
+                    matched = True
+                    break
+            if not matched:
+                phonemes.append(word[i])
+                i += 1
+    return phonemes
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    assert legacy_split(SAMPLE_IPA) == split_phonemes(SAMPLE_IPA)
+
+    batch = [SAMPLE_IPA] * 10
+    legacy = timeit.timeit(lambda: legacy_split(SAMPLE_IPA), number=repeat) / repeat
+    compiled = timeit.timeit(lambda: split_phonemes(SAMPLE_IPA), number=repeat) / repeat
+    batched = timeit.timeit(lambda: split_phonemes_batch(batch), number=repeat) / repeat / len(batch)
+
+    print(f"input: {len(SAMPLE_IPA)} chars, {len(split_phonemes(SAMPLE_IPA))} phonemes")
+    print(f"legacy scan     : {legacy * 1000:8.3f} ms")
+    print(f"compiled regex  : {compiled * 1000:8.3f} ms  ({legacy / compiled:.1f}x)")
+    print(f"batch (per item): {batched * 1000:8.3f} ms  ({legacy / batched:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
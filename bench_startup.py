@@ -0,0 +1,71 @@
+"""
+Worker startup budget: import time of handshake and first-request latency.
+
+    python bench_startup.py [runs] [--warmup] [--user USER_ID]
+
+Each run is a fresh interpreter (what a gunicorn worker pays on boot).
+--warmup also times warmup.warmup() per client (needs the real services);
+--user sends one /api/v1/send-msg for that candidate, cold and then warm.
+"""
+import sys
+import json
+import subprocess
+
+import numpy as np
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+import handshake
+imported = time.perf_counter()
+client = handshake.app.test_client()
+client.post("/test")
+first = time.perf_counter()
+client.post("/test")
+second = time.perf_counter()
+out = {"import": imported - start, "first_request": first - imported, "second_request": second - first}
+opts = json.loads(sys.argv[1])
+if opts["warmup"]:
+    from warmup import warmup
+    out["warmup"] = warmup()
+if opts["user"]:
+    for label in ("send_msg_cold", "send_msg_warm"):
+        t = time.perf_counter()
+        client.post("/api/v1/send-msg", json={"userId": opts["user"]})
+        out[label] = time.perf_counter() - t
+print("BENCH " + json.dumps(out))
+"""
+
+
+def run_once(opts):
+    proc = subprocess.run([sys.executable, "-c", CHILD, json.dumps(opts)], capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH "):])
+    raise RuntimeError(f"child failed:\n{proc.stderr[-2000:]}")
+
+
+def summary(samples):
+    ms = np.array(samples) * 1000
+    return f"p50={np.percentile(ms, 50):8.1f} ms  max={ms.max():8.1f} ms"
+
+
+def main():
+    args = sys.argv[1:]
+    user = args[args.index("--user") + 1] if "--user" in args else None
+    positional = [a for a in args if not a.startswith("--") and a != user]
+    runs = int(positional[0]) if positional else 5
+    opts = {"warmup": "--warmup" in args, "user": user}
+
+    results = [run_once(opts) for _ in range(runs)]
+    for key in ("import", "first_request", "second_request", "send_msg_cold", "send_msg_warm"):
+        if key in results[0]:
+            print(f"{key:15}: {summary([r[key] for r in results])}")
+    if opts["warmup"]:
+        for name in results[0]["warmup"]:
+            samples = [r["warmup"][name] for r in results if r["warmup"][name] is not None]
+            print(f"warmup {name:13}: {summary(samples) if samples else 'failed'}")
+
+
+if __name__ == "__main__":
+    main()
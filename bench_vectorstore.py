@@ -0,0 +1,70 @@
+"""
+Query latency: in-process LocalIndex vs the remote Pinecone index.
+
+    python bench_vectorstore.py [n_vectors] [--remote]
+
+--remote also times queries against the configured Pinecone index
+(needs PINECONE_API); the local side runs anywhere.
+"""
+import sys
+import time
+
+import numpy as np
+
+from vectorstore import LocalIndex, get_index, INDEX_NAME
+from embeddings import EMBEDDING_DIM
+
+N_QUERIES = 200
+N_USERS = 50
+TOPICS = ["OOP", "Collections", "JVM internals", "REST", "JPA", "Security", "SQL", "Kafka"]
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return f"p50={np.percentile(ms, 50):7.3f} ms  p99={np.percentile(ms, 99):7.3f} ms"
+
+
+def time_queries(index, queries, **kwargs):
+    samples = []
+    for q, flt in queries:
+        start = time.perf_counter()
+        index.query(vector=q.tolist(), top_k=1, include_metadata=True, filter=flt, **kwargs)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    n = int(args[0]) if args else 10000
+    rng = np.random.default_rng(0)
+
+    local = LocalIndex(EMBEDDING_DIM)
+    vectors = rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+    start = time.perf_counter()
+    for i in range(0, n, 500):
+        local.upsert(vectors=[{
+            "id": f"v{j}",
+            "values": vectors[j],
+            "metadata": {
+                "type": "summary" if j % 4 == 0 else "qna",
+                "user_id": f"user{j % N_USERS}",
+                "topic": TOPICS[j % len(TOPICS)],
+            },
+        } for j in range(i, min(i + 500, n))])
+    print(f"local upsert   : {n} vectors in {time.perf_counter() - start:.2f} s")
+
+    queries = [
+        (rng.standard_normal(EMBEDDING_DIM).astype(np.float32),
+         {"type": "summary", "user_id": f"user{i % N_USERS}", "topic": TOPICS[i % len(TOPICS)]})
+        for i in range(N_QUERIES)
+    ]
+    print(f"local filtered : {percentiles(time_queries(local, queries))}")
+    print(f"local unfiltered: {percentiles(time_queries(local, [(q, None) for q, _ in queries]))}")
+
+    if "--remote" in sys.argv:
+        remote = get_index(INDEX_NAME, backend="pinecone")
+        print(f"remote filtered: {percentiles(time_queries(remote, queries[:50]))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import openai
+import redis
+from dotenv import load_dotenv
+
+# vectors are stored as raw float32 bytes, so the non-decoding client
+from redisclient import redis_bytes_client as redis_client
+
+load_dotenv()
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+# ---------------- Config ---------------- #
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1024          # Pinecone index dimension
+BATCH_WINDOW = 0.01           # seconds to wait for more requests before calling the API
+MAX_BATCH = 64                # inputs per embeddings.create call
+MEMORY_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+REDIS_TTL = 7 * 86400
+REDIS_PREFIX = "emb:"
+
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def fit_dim(vector, dim=EMBEDDING_DIM):
+    """Truncate or zero-pad to the index dimension."""
+    vector = np.asarray(vector, dtype=np.float32)
+    if len(vector) == dim:
+        return vector
+    out = np.zeros(dim, dtype=np.float32)
+    n = min(dim, len(vector))
+    out[:n] = vector[:n]
+    return out
+
+
+# ---------------- Embedding Service ---------------- #
+class EmbeddingService:
+    """
+    One embedding layer for every agent: concurrent embed() calls are
+    coalesced into batched embeddings.create requests, and vectors are
+    cached in memory and in Redis by sha256(model, text).
+    """
+
+    def __init__(self, model=EMBEDDING_MODEL, dim=EMBEDDING_DIM):
+        self.model = model
+        self.dim = dim
+        self._memory = OrderedDict()        # key -> read-only float32 vector (LRU)
+        self._inflight = {}                 # key -> Future, so duplicates share one request
+        self._pending = []                  # (key, text) waiting for the batcher
+        self._cond = threading.Condition()
+        self._worker = None
+
+    # --- Public API ---
+    def embed(self, text):
+        """Return the embedding of text as a float32 numpy array."""
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts):
+        return [f.result() for f in self.submit_many(texts)]
+
+    def submit_many(self, texts):
+        """One Future per text, each resolved on its own: a failed input fails only its future."""
+        return [self._submit(text) for text in texts]
+
+    # --- Cache ---
+    def _memory_get(self, key):
+        with self._cond:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    def _memory_put(self, key, vector):
+        vector.setflags(write=False)
+        with self._cond:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_CACHE_SIZE:
+                self._memory.popitem(last=False)
+
+    # --- Batching ---
+    def _submit(self, text):
+        key = cache_key(self.model, text)
+        future = Future()
+        vector = self._memory_get(key)
+        if vector is not None:
+            future.set_result(vector)
+            return future
+
+        with self._cond:
+            if key in self._inflight:
+                return self._inflight[key]
+            self._inflight[key] = future
+            self._pending.append((key, text))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(BATCH_WINDOW)   # let concurrent callers join this batch
+            with self._cond:
+                batch, self._pending = self._pending[:MAX_BATCH], self._pending[MAX_BATCH:]
+            self._resolve(batch)
+
+    def _create(self, misses):
+        """
+        Embed (key, text) misses in one API call. If that call fails, retry each
+        input on its own, so one bad input (too long, empty) only fails its own
+        caller and not the others who happened to share the batch.
+        Returns ({key: vector}, {key: exception}).
+        """
+        try:
+            response = openai.embeddings.create(model=self.model, input=[text for _, text in misses])
+            return {key: fit_dim(item.embedding, self.dim) for (key, _), item in zip(misses, response.data)}, {}
+        except Exception as e:
+            if len(misses) == 1:
+                return {}, {misses[0][0]: e}
+            print(f"⚠️ Batched embedding of {len(misses)} inputs failed ({e}), retrying one by one")
+
+        fresh, errors = {}, {}
+        for key, text in misses:
+            try:
+                response = openai.embeddings.create(model=self.model, input=[text])
+                fresh[key] = fit_dim(response.data[0].embedding, self.dim)
+            except Exception as e:
+                errors[key] = e
+        return fresh, errors
+
+    def _resolve(self, batch):
+        keys = [key for key, _ in batch]
+        results = {}
+        errors = {}
+        try:
+            # 1️⃣ shared Redis cache (one MGET for the whole batch)
+            try:
+                cached = redis_client.mget([REDIS_PREFIX + k for k in keys])
+            except redis.RedisError as e:
+                print(f"⚠️ Embedding cache unavailable: {e}")
+                cached = [None] * len(keys)
+            for key, raw in zip(keys, cached):
+                if raw is not None and len(raw) == self.dim * 4:
+                    results[key] = np.frombuffer(raw, dtype=np.float32).copy()
+
+            # 2️⃣ one API call for all misses
+            misses = [(key, text) for key, text in batch if key not in results]
+            if misses:
+                fresh, errors = self._create(misses)
+                results.update(fresh)
+                if fresh:
+                    try:
+                        pipe = redis_client.pipeline(transaction=False)
+                        for key, vector in fresh.items():
+                            pipe.set(REDIS_PREFIX + key, vector.tobytes(), ex=REDIS_TTL)
+                        pipe.execute()
+                    except redis.RedisError as e:
+                        print(f"⚠️ Embedding cache unavailable: {e}")
+
+            for key, vector in results.items():
+                self._memory_put(key, vector)
+            error = None
+        except Exception as e:
+            error = e
+
+        with self._cond:
+            futures = [(key, self._inflight.pop(key)) for key in keys if key in self._inflight]
+        for key, future in futures:
+            if key in results:
+                future.set_result(results[key])
+            elif error is not None or key in errors:
+                future.set_exception(errors.get(key, error))
+            else:
+                future.set_exception(ValueError(f"no embedding returned for {key}"))
+
+
+embedding_service = EmbeddingService()
+
+
+def embed_text(text):
+    """Embedding of one text (float32 numpy array, EMBEDDING_DIM long)."""
+    return embedding_service.embed(text)
+
+
+def embed_texts(texts):
+    return embedding_service.embed_many(texts)
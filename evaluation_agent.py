@@ -1,29 +1,23 @@
 import os
-import json
 import openai
-from pinecone import Pinecone, ServerlessSpec
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+from vectorstore import get_index, INDEX_NAME
+from vectorbuffer import VectorWriteBehind
+from summarycache import put_summary
+from jsonstream import parse_json_response
 
 # ---------------- Load Environment Variables ---------------- #
 load_dotenv()
 
-# Embedding model selection — ensure 1024-dim embeddings
-EMBEDDING_MODEL = "text-embedding-3-small"  # 1024 dimensions
+# ---------------- Vector Index (Pinecone or local, see vectorstore.VECTOR_BACKEND) ---------------- #
+# Q&A and summary vectors are written behind the request path, in batches;
+# the index is only connected when the first batch is flushed
+vector_writer = VectorWriteBehind(lambda: get_index(INDEX_NAME))
 
-# ---------------- Initialize Pinecone ---------------- #
-pc = Pinecone(api_key=os.getenv("PINECONE_API"))
-INDEX_NAME = "topic-summary"
-
-# Create index if it does not exist
-if INDEX_NAME not in [idx["name"] for idx in pc.list_indexes()]:
-    pc.create_index(
-        name=INDEX_NAME,
-        dimension=1024,  # 1024 dimensions for text-embedding-3-small
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-    )
-
-index = pc.Index(INDEX_NAME)
+# Topic evaluations (chat + embedding + upsert) run off the question request path
+EVALUATION_WORKERS = int(os.getenv("EVALUATION_WORKERS", "4"))
+evaluation_pool = ThreadPoolExecutor(max_workers=EVALUATION_WORKERS, thread_name_prefix="topic-eval")
 
 
 # ---------------- EvaluationAgent ---------------- #
@@ -34,6 +28,7 @@ class EvaluationAgent:
         self.topics = {}  # topic -> {score, summary, next_stage}
         self.current_topic = None
         self.questions_under_topic = []
+        self.pending_evaluations = []   # futures of background topic evaluations
 
     # ---------------- Add Q&A ---------------- #
     def add_question_answer(self, question: str, answer: str, topic: str, user_id: str):
@@ -41,51 +36,67 @@ class EvaluationAgent:
             print("⚠️ Skipping empty question or answer")
             return
 
-        # Save Q&A embedding
-        self._save_qna_embedding(user_id, topic, question, answer)
+        finished = self.record_answer(question, answer, topic)
+        self.on_answer_recorded(question, answer, topic, user_id, finished)
 
-        # Check if topic changed
+    def record_answer(self, question: str, answer: str, topic: str):
+        """
+        State-only part of add_question_answer (safe to repeat after reloading
+        state). Returns (topic, qna_list) for a topic this answer finished, else None.
+        """
+        finished = None
         if self.current_topic and topic.strip().lower() != self.current_topic.strip().lower():
-            self._evaluate_topic(self.current_topic, self.questions_under_topic, user_id)
+            finished = (self.current_topic, self.questions_under_topic)
             self.questions_under_topic = []
 
         self.current_topic = topic
         self.questions_under_topic.append({"question": question, "answer": answer})
+        return finished
+
+    def on_answer_recorded(self, question: str, answer: str, topic: str, user_id: str, finished=None):
+        # Save Q&A embedding
+        self._save_qna_embedding(user_id, topic, question, answer)
+
+        # Topic changed: evaluate the finished topic in the background
+        if finished:
+            self._submit_evaluation(*finished, user_id)
+
+    # ---------------- Shared State ---------------- #
+    def to_state(self):
+        """Pending (not yet evaluated) Q&A, as stored in interviewstate."""
+        return {"topic": self.current_topic, "qna": list(self.questions_under_topic)}
+
+    def load_state(self, state):
+        state = state or {}
+        self.current_topic = state.get("topic")
+        self.questions_under_topic = list(state.get("qna") or [])
 
     # ---------------- Save Q&A Embedding ---------------- #
     def _save_qna_embedding(self, user_id: str, topic: str, question: str, answer: str):
         try:
             text = f"Topic: {topic}\nQuestion: {question}\nAnswer: {answer}"
-            emb_response = openai.embeddings.create(model=EMBEDDING_MODEL, input=text)
-            vector = emb_response.data[0].embedding
-
-            # Normalize embedding to 1024 dims (truncate or pad) if provider returns different size
-            expected_dim = 1024
-            if len(vector) != expected_dim:
-                print(f"⚠️ Embedding length {len(vector)} != {expected_dim}. Normalizing (truncate/pad).")
-                # Truncate if longer, pad with zeros if shorter
-                if len(vector) > expected_dim:
-                    vector = vector[:expected_dim]
-                else:
-                    vector = vector + [0.0] * (expected_dim - len(vector))
 
             vector_id = f"{user_id}-{topic}-{abs(hash(question))}"
-            index.upsert(
-                vectors=[{
-                    "id": vector_id,
-                    "values": vector,
-                    "metadata": {
-                        "user_id": user_id,
-                        "topic": topic,
-                        "question": question[:200],
-                        "answer": answer[:200],
-                    }
-                }]
-            )
-            print(f"✅ Stored embedding for Q&A (topic='{topic}', id={vector_id})")
+            vector_writer.add({
+                "id": vector_id,
+                "text": text,   # embedded by the write-behind flusher
+                "metadata": {
+                    "user_id": user_id,
+                    "topic": topic,
+                    "question": question[:200],
+                    "answer": answer[:200],
+                }
+            })
+            print(f"✅ Queued embedding for Q&A (topic='{topic}', id={vector_id})")
         except Exception as e:
             print(f"❌ Error saving Q&A to Pinecone: {e}")
 
+    def _submit_evaluation(self, topic: str, qna_list: list, user_id: str):
+        self.pending_evaluations = [f for f in self.pending_evaluations if not f.done()]
+        future = evaluation_pool.submit(self._evaluate_topic, topic, list(qna_list), user_id)
+        self.pending_evaluations.append(future)
+        return future
+
     # ---------------- Evaluate Topic ---------------- #
     def _evaluate_topic(self, topic: str, qna_list: list, user_id: str):
         qna_text = "\n".join([f"Q: {q['question']}\nA: {q['answer']}" for q in qna_list])
@@ -133,11 +144,12 @@ class EvaluationAgent:
                     {"role": "user", "content": prompt},
                 ],
                 temperature=0.3,
+                response_format={"type": "json_object"},
             )
             raw_output = response.choices[0].message.content.strip()
             try:
-                feedback = json.loads(raw_output)
-            except json.JSONDecodeError:
+                feedback = parse_json_response(raw_output)
+            except ValueError:
                 feedback = {"score": 0, "summary": raw_output, "next_stage": "basic"}
 
             self.topics[topic] = feedback
@@ -154,6 +166,9 @@ class EvaluationAgent:
 
     # ---------------- Store Topic Summary ---------------- #
     def _store_topic_summary(self, user_id: str, topic: str, feedback: dict):
+        # question generation reads this directly, no embedding or vector query needed
+        put_summary(user_id, topic, feedback)
+
         try:
             summary_text = (
                 f"Topic: {topic}\n"
@@ -162,39 +177,28 @@ class EvaluationAgent:
                 f"Stage: {feedback.get('next_stage')}"
             )
 
-            embedding_response = openai.embeddings.create(model=EMBEDDING_MODEL, input=summary_text)
-            vector = embedding_response.data[0].embedding
-
-            expected_dim = 1024
-            if len(vector) != expected_dim:
-                print(f"⚠️ Embedding length {len(vector)} != {expected_dim}. Normalizing (truncate/pad).")
-                if len(vector) > expected_dim:
-                    vector = vector[:expected_dim]
-                else:
-                    vector = vector + [0.0] * (expected_dim - len(vector))
-
             vector_id = f"{user_id}-{topic}-summary"
-            index.upsert(
-                vectors=[{
-                    "id": vector_id,
-                    "values": vector,
-                    "metadata": {
-                        "type": "summary",
-                        "user_id": user_id,
-                        "topic": topic,
-                        "score": feedback.get("score"),
-                        "summary": feedback.get("summary"),
-                        "next_stage": feedback.get("next_stage"),
-                    }
-                }]
-            )
-            print(f"📊 Topic summary stored in Pinecone for '{topic}' (user={user_id})")
+            vector_writer.add({
+                "id": vector_id,
+                "text": summary_text,
+                "metadata": {
+                    "type": "summary",
+                    "user_id": user_id,
+                    "topic": topic,
+                    "score": feedback.get("score"),
+                    "summary": feedback.get("summary"),
+                    "next_stage": feedback.get("next_stage"),
+                    "weak_areas": feedback.get("weak_areas") or [],
+                }
+            })
+            print(f"📊 Topic summary queued for Pinecone for '{topic}' (user={user_id})")
 
         except Exception as e:
             print(f"❌ Error storing topic summary: {e}")
 
     # ---------------- Finalize ---------------- #
     def finalize(self, user_id: str):
+        wait(self.pending_evaluations)
         if self.current_topic and self.questions_under_topic:
             self._evaluate_topic(self.current_topic, self.questions_under_topic, user_id)
         return self.topics
@@ -1,33 +1,46 @@
-import PyPDF2
 import json
 import os
+import hashlib
+import threading
 import redis
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage
-from patternagent import generate_question_patterns
+from patternagent import generate_question_patterns, start_skill_patterns, collect_skill_patterns, PATTERN_FANOUT
 from dotenv import load_dotenv
+from redisclient import redis_client
+from pdftext import extract_pdf_text, read_upload, PDFTooLarge
+from jsonstream import JSONStreamParser
+from interviewstate import clear_state
 
 
 # Load environment
 load_dotenv(override=True)
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 
+RESUME_MODEL = "gpt-4.1-mini"
+PROMPT_VERSION = "2"        # bump when the resume or pattern prompt changes
+ANALYSIS_CACHE_TTL = 7 * 86400
+ANALYSIS_PREFIX = "resume_analysis:"
+USER_TTL = 86400
 
-# Redis Connection
-redis_client = redis.Redis(
-    host="localhost",
-    port=6379,
-    db=0,
-    decode_responses=True
-)
 
-# LLM instance
-llm = ChatOpenAI(
-    model="gpt-4.1-mini",
-    api_key=OPENAI_KEY,
-    temperature=0.7
-)
+# LLM instance (built on first use)
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = ChatOpenAI(
+                    model=RESUME_MODEL,
+                    api_key=OPENAI_KEY,
+                    temperature=0.7
+                )
+    return _llm
 
 # Prompt template
 prompt_template_resume = PromptTemplate(
@@ -62,18 +75,92 @@ Job Description:
 """
 )
 
-# PDF → Text
+# PDF → Text (parallel over pages, cached by file hash; see pdftext)
 def extract_text_from_pdf(file):
-    pdf = PyPDF2.PdfReader(file)
-    text = ""
-    for pg in pdf.pages:
-        text += pg.extract_text() or ""
-    return text.strip()
+    return extract_pdf_text(read_upload(file))
+
+
+# Analysis cache: same resume + same JD -> same topics and patterns
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def analysis_key(resume_text, job_description):
+    raw = "\x00".join([PROMPT_VERSION, RESUME_MODEL, _normalize(resume_text), _normalize(job_description)])
+    return ANALYSIS_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _get_cached_analysis(key):
+    try:
+        raw = redis_client.get(key)
+    except redis.RedisError as e:
+        print(f"⚠️ Resume analysis cache unavailable: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+def _bind_to_user(user_id, question_patterns, cache_key=None, parsed=None):
+    """
+    Store the candidate's question structure (and, on a miss, the shared
+    analysis) in one round trip. A new structure starts a new interview, so
+    the old cursor and pending question are cleared with it.
+    """
+    from questionagent import forget_agents
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.set(user_id, json.dumps({"question": question_patterns}), ex=USER_TTL)
+    clear_state(user_id, pipe)
+    if cache_key is not None:
+        parsed = {k: v for k, v in parsed.items() if k != "userId"}
+        pipe.set(cache_key, json.dumps({"parsed": parsed, "questionPatterns": question_patterns}),
+                 ex=ANALYSIS_CACHE_TTL)
+    pipe.execute()
+    forget_agents(user_id)   # other workers notice the new structure in _agent_for
+
+
+# Pattern prompts started while the resume analysis is still streaming
+class _EarlySkillPatterns:
+    def __init__(self, llm):
+        self.llm = llm
+        self.experience = None
+        self.waiting = []       # skills streamed in before experienceYears
+        self.futures = []
+
+    def on_entry(self, path, value):
+        if path == ("experienceYears",):
+            self.experience = value
+            for skill, topics in self.waiting:
+                self.futures.append(start_skill_patterns(skill, topics, value, self.llm))
+            self.waiting = []
+        elif len(path) == 2 and path[0] == "topicsToEvaluate":
+            if self.experience is None:
+                self.waiting.append((path[1], value))
+            else:
+                self.futures.append(start_skill_patterns(path[1], value, self.experience, self.llm))
+
+    def collect(self, parsed):
+        experience = parsed.get("experienceYears", 1)
+        for skill, topics in self.waiting:
+            self.futures.append(start_skill_patterns(skill, topics, experience, self.llm))
+        self.waiting = []
+        return collect_skill_patterns(self.futures)
 
 
 # Main function to call from Flask
 def settopics_resume(user_id, job_description, resume_file):
-    resume_text = extract_text_from_pdf(resume_file)
+    try:
+        resume_text = extract_text_from_pdf(resume_file)
+    except PDFTooLarge as e:
+        return {"error": str(e)}, 413
+    except Exception as e:
+        return {"error": f"Could not read PDF: {e}"}, 400
+
+    cache_key = analysis_key(resume_text, job_description or "N/A")
+    cached = _get_cached_analysis(cache_key)
+    if cached is not None:
+        # only the owner changes: rebind to this userId, no LLM calls
+        _bind_to_user(user_id, cached["questionPatterns"])
+        return cached["questionPatterns"]
 
     prompt = prompt_template_resume.format(resume_text=resume_text, jd_text=job_description or "N/A")
     messages = [
@@ -81,20 +168,25 @@ def settopics_resume(user_id, job_description, resume_file):
         HumanMessage(content=prompt)
     ]
 
-    res = llm.invoke(messages)
+    llm = get_llm()
 
+    # Stream the analysis (JSON mode); with fan-out, each skill's pattern
+    # prompt starts as soon as its topics have been written
+    early = _EarlySkillPatterns(llm) if PATTERN_FANOUT else None
+    parser = JSONStreamParser(early.on_entry if early else None, max_depth=2)
     try:
-        raw = res.content.strip()
-        parsed = json.loads(raw[raw.find("{"): raw.rfind("}") + 1])
+        parsed = parser.consume(llm.bind(response_format={"type": "json_object"}).stream(messages))
         parsed["userId"] = user_id
-    except Exception:
-        return {"error": "Could not parse extracted JSON", "raw": res.content}, 500
+    except ValueError:
+        return {"error": "Could not parse extracted JSON", "raw": parser.text}, 500
 
     # Generate question patterns
-    question_patterns = generate_question_patterns(parsed, llm)
+    if early is not None and early.futures + early.waiting:
+        question_patterns = early.collect(parsed)
+    else:
+        question_patterns = generate_question_patterns(parsed, llm)
 
     # Save in Redis
-    redis_client.set(user_id, json.dumps({"question": question_patterns}))
-    redis_client.expire(user_id, 86400)
+    _bind_to_user(user_id, question_patterns, cache_key, parsed)
 
     return question_patterns
@@ -2,13 +2,14 @@ import numbers
 import os
 import json
 import time
-from flask import Flask, request, jsonify
-from phonemizer import phonemize
+import struct
+import threading
+from functools import lru_cache
+import numpy as np
+from phonemizer.backend import EspeakBackend
 import re
 
 
-app = Flask(__name__)
-
 # Your phenome map
 phenome_map = {
     "p":   { "jawOpen": 0.2, "mouthFunnel": 0.8, "mouthPucker": 0.6, "tongue_out": 0.0, "tongue_up": 0.0 },
@@ -57,57 +58,81 @@ phenome_map = {
 
 import json
 
+# multi-char phoneme list
+MULTI_CHAR_PHONEMES = [
+    "tʃ", "dʒ", "aɪ", "oʊ", "eɪ", "ɔː", "ɜː", "ʊə", "əʊ", "ɪə",
+    "ɑː", "æ", "ɛ", "ɪ", "iː", "ɒ", "ʌ", "ʊ", "uː", "ɔɪ", "aʊ",
+    "p", "b", "t", "d", "k", "g", "f", "v", "θ", "ð", "s", "z",
+    "ʃ", "ʒ", "h", "m", "n", "ŋ", "l", "r", "j", "w"
+]
+
+# Longest-match tokenizer, compiled once: known phonemes longest first,
+# then any other single non-space character on its own.
+PHONEME_PATTERN = re.compile(
+    "|".join(re.escape(m) for m in sorted(MULTI_CHAR_PHONEMES, key=len, reverse=True)) + r"|\S"
+)
+PUNCTUATION_PATTERN = re.compile(r'[.,!?;:]')
+
+
+def split_phonemes(ipa_str: str):
+    """Split an IPA string into phonemes (punctuation and spaces dropped)."""
+    return PHONEME_PATTERN.findall(PUNCTUATION_PATTERN.sub('', ipa_str))
+
+
+def split_phonemes_batch(ipa_strings):
+    """Tokenize many IPA strings in one call; returns one phoneme list per input."""
+    findall, strip_punct = PHONEME_PATTERN.findall, PUNCTUATION_PATTERN.sub
+    return [findall(strip_punct('', ipa_str)) for ipa_str in ipa_strings]
+
+
+# ---------------- Espeak Backend (LOAD ONCE) ---------------- #
+PHONEME_CACHE_SIZE = int(os.getenv("PHONEME_CACHE_SIZE", "1024"))
+
+_backend = None
+_backend_lock = threading.Lock()   # espeak is not re-entrant: one phonemize at a time
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = EspeakBackend(
+                    language='en-us',
+                    preserve_punctuation=True,
+                    with_stress=False
+                )
+    return _backend
+
+
+def phonemize_text(text: str) -> str:
+    """Text -> IPA string using the shared espeak backend."""
+    backend = _get_backend()
+    with _backend_lock:
+        return backend.phonemize([text], strip=True)[0]
+
+
+@lru_cache(maxsize=PHONEME_CACHE_SIZE)
+def text_to_phonemes(text: str):
+    """Cached text -> phoneme tuple; the same questions are spoken again and again."""
+    return tuple(split_phonemes(phonemize_text(text)))
+
+
 def generate_phonemes(text: str, duration: numbers.Number):
     """
-    Convert text into individual IPA phonemes and generate blendData.
+    Convert text into individual IPA phonemes and generate blendData in the
+    original ("legacy") shape: one dict per raw espeak phoneme, evenly spaced.
     Ensures total duration does not exceed the specified duration.
     """
-    # 1️⃣ phonemize text
-    ipa_str = phonemize(
-        text,
-        language='en-us',
-        backend='espeak',
-        strip=True,
-        preserve_punctuation=True,
-        with_stress=False
-    )
-
-    # 2️⃣ remove punctuation
-    ipa_str = re.sub(r'[.,!?;:]', '', ipa_str)
-
-    # 3️⃣ split words
-    words = ipa_str.split()
-
-    # 4️⃣ multi-char phoneme list
-    multi_char_phonemes = [
-        "tʃ", "dʒ", "aɪ", "oʊ", "eɪ", "ɔː", "ɜː", "ʊə", "əʊ", "ɪə",
-        "ɑː", "æ", "ɛ", "ɪ", "iː", "ɒ", "ʌ", "ʊ", "uː", "ɔɪ", "aʊ",
-        "p", "b", "t", "d", "k", "g", "f", "v", "θ", "ð", "s", "z",
-        "ʃ", "ʒ", "h", "m", "n", "ŋ", "l", "r", "j", "w"
-    ]
+    # 1️⃣ phonemize text (cached), split into individual phonemes
+    phonemes = text_to_phonemes(text)
 
-    # 5️⃣ split into individual phonemes
-    phonemes = []
-    for word in words:
-        i = 0
-        while i < len(word):
-            matched = False
-            for m in sorted(multi_char_phonemes, key=len, reverse=True):  # match longest first
-                if word[i:i + len(m)] == m:
-                    phonemes.append(m)
-                    i += len(m)
-                    matched = True
-                    break
-            if not matched:
-                phonemes.append(word[i])
-                i += 1
-
-    # 6️⃣ calculate step to fit total duration
+    # 2️⃣ calculate step to fit total duration
     if len(phonemes) == 0:
         return []
     step = duration / len(phonemes)
 
-    # 7️⃣ generate blendData
+    # 3️⃣ generate blendData
     blend_data = []
     current_time = 0.0
 
@@ -125,16 +150,126 @@ def generate_phonemes(text: str, duration: numbers.Number):
     return blend_data
 
 
-@app.route("/phonemes", methods=["POST"])
-def phonemes():
-    data = request.json
-    text = data.get("text", "")
-    result, elapsed = generate_phonemes(text)
-    return jsonify({
-        "phonemes": result,
-        "time_taken_seconds": round(elapsed, 2)
-    })
+# ---------------- Columnar blendData (NumPy) ---------------- #
+BLEND_CHANNELS = ["jawOpen", "mouthFunnel", "mouthPucker", "tongue_out", "tongue_up"]
+
+# Static id table (ids must agree across workers because blendData is cached in Redis):
+# mapped phonemes first, then symbols espeak emits that have no mouth shape yet.
+PHONEME_VOCAB = list(phenome_map) + [
+    ph for ph in MULTI_CHAR_PHONEMES + [
+        "ɹ", "ɚ", "ɾ", "ᵻ", "ɐ", "ɡ", "ɑ", "ɔ", "ɛ", "i", "u", "o", "a", "ʔ", "ː", "ˈ", "ˌ"
+    ] if ph not in phenome_map
+]
+PHONEME_VOCAB = list(dict.fromkeys(PHONEME_VOCAB)) + ["?"]
+PHONEME_IDS = {ph: i for i, ph in enumerate(PHONEME_VOCAB)}
+UNKNOWN_ID = PHONEME_IDS["?"]
+
+# one row per phoneme id, one column per channel; unmapped phonemes stay at rest (zeros)
+BLEND_MATRIX = np.zeros((len(PHONEME_VOCAB), len(BLEND_CHANNELS)), dtype=np.float32)
+for _ph, _params in phenome_map.items():
+    BLEND_MATRIX[PHONEME_IDS[_ph]] = [_params.get(c, 0.0) for c in BLEND_CHANNELS]
+
+# Relative duration per phoneme class: vowels are held longer than stops.
+PHONEME_CLASS_WEIGHTS = {
+    "vowel": 1.6,
+    "diphthong": 1.9,
+    "stop": 0.7,
+    "nasal": 1.0,
+    "fricative": 1.1,
+    "approximant": 0.9,
+    "other": 1.0,
+}
+PHONEME_CLASSES = {
+    "stop": ["p", "b", "t", "d", "k", "g", "ɡ", "tʃ", "dʒ", "ʔ", "ɾ"],
+    "nasal": ["m", "n", "ŋ"],
+    "fricative": ["f", "v", "θ", "ð", "s", "z", "ʃ", "ʒ", "h"],
+    "approximant": ["l", "r", "ɹ", "j", "w"],
+    "vowel": ["iː", "ɪ", "e", "æ", "ʌ", "ɒ", "ɔː", "ɑː", "uː", "ʊ", "ɜː", "ə", "ɚ", "ᵻ", "ɐ",
+              "ɑ", "ɔ", "ɛ", "i", "u", "o", "a"],
+    "diphthong": ["eɪ", "aɪ", "ɔɪ", "aʊ", "əʊ", "oʊ", "ɪə", "eə", "ʊə"],
+}
+PHONEME_WEIGHTS = np.full(len(PHONEME_VOCAB), PHONEME_CLASS_WEIGHTS["other"], dtype=np.float64)
+for _cls, _members in PHONEME_CLASSES.items():
+    for _ph in _members:
+        if _ph in PHONEME_IDS:
+            PHONEME_WEIGHTS[PHONEME_IDS[_ph]] = PHONEME_CLASS_WEIGHTS[_cls]
+for _ph in ("ˈ", "ˌ", "ː"):   # stress/length marks take no time of their own
+    PHONEME_WEIGHTS[PHONEME_IDS[_ph]] = 0.0
+
+
+@lru_cache(maxsize=PHONEME_CACHE_SIZE)
+def text_to_phoneme_ids(text: str):
+    """Cached text -> read-only array of phoneme ids."""
+    ids = np.fromiter(
+        (PHONEME_IDS.get(ph, UNKNOWN_ID) for ph in text_to_phonemes(text)),
+        dtype=np.uint16
+    )
+    ids.setflags(write=False)
+    return ids
+
+
+def blend_columns(ids, duration, weighted=True):
+    """
+    Timeline as parallel arrays: start time, phoneme id, and one float32
+    array per blendshape channel. Timing is weight-proportional (or uniform).
+    """
+    if len(ids) == 0:
+        return {"time": np.zeros(0, dtype=np.float32), "phonemeId": ids,
+                **{c: np.zeros(0, dtype=np.float32) for c in BLEND_CHANNELS}}
+    weights = PHONEME_WEIGHTS[ids] if weighted else np.ones(len(ids))
+    total = weights.sum() or len(ids)
+    starts = np.concatenate(([0.0], np.cumsum(weights)[:-1])) * (float(duration) / total)
+    values = BLEND_MATRIX[ids]
+    columns = {"time": starts.astype(np.float32), "phonemeId": ids}
+    for k, channel in enumerate(BLEND_CHANNELS):
+        columns[channel] = values[:, k]
+    return columns
+
+
+def columns_to_json(columns):
+    """Compact JSON arrays (ids index into "vocab")."""
+    return {
+        "format": "columnar",
+        "vocab": PHONEME_VOCAB,
+        "channels": BLEND_CHANNELS,
+        "time": np.round(columns["time"].astype(np.float64), 3).tolist(),
+        "phonemeId": columns["phonemeId"].tolist(),
+        **{c: np.round(columns[c].astype(np.float64), 3).tolist() for c in BLEND_CHANNELS},
+    }
+
+
+# Packed layout (little-endian): b"BLND", version u8, channel count u8, n u32,
+# time f32[n], phonemeId u16[n], then each channel f32[n] in BLEND_CHANNELS order.
+BLEND_MAGIC = b"BLND"
+BLEND_HEADER = struct.Struct("<4sBBI")
+
+
+def pack_columns(columns):
+    n = len(columns["time"])
+    parts = [
+        BLEND_HEADER.pack(BLEND_MAGIC, 1, len(BLEND_CHANNELS), n),
+        np.asarray(columns["time"], dtype="<f4").tobytes(),
+        np.asarray(columns["phonemeId"], dtype="<u2").tobytes(),
+    ]
+    parts += [np.asarray(columns[c], dtype="<f4").tobytes() for c in BLEND_CHANNELS]
+    return b"".join(parts)
+
+
+def unpack_columns(data):
+    magic, version, n_channels, n = BLEND_HEADER.unpack_from(data)
+    if magic != BLEND_MAGIC:
+        raise ValueError("not a packed blendData buffer")
+    offset = BLEND_HEADER.size
+    columns = {"time": np.frombuffer(data, dtype="<f4", count=n, offset=offset)}
+    offset += 4 * n
+    columns["phonemeId"] = np.frombuffer(data, dtype="<u2", count=n, offset=offset)
+    offset += 2 * n
+    for channel in BLEND_CHANNELS[:n_channels]:
+        columns[channel] = np.frombuffer(data, dtype="<f4", count=n, offset=offset)
+        offset += 4 * n
+    return columns
 
 
-if __name__ == "__main__":
-    app.run(port=3002, debug=True)
+def generate_blend(text: str, duration: numbers.Number, weighted=True):
+    """Columnar blendData (JSON-ready) for text spoken over duration seconds."""
+    return columns_to_json(blend_columns(text_to_phoneme_ids(text), duration, weighted))
@@ -0,0 +1,17 @@
+# Picked up automatically by `gunicorn handshake:application` (see Procfile).
+import os
+import threading
+
+# Threaded workers: a resume job's SSE stream (resumejobs.job_events) holds
+# one thread while it waits, not a whole sync worker
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+
+def post_worker_init(worker):
+    """After fork and app load: connect external clients in the background."""
+    from warmup import warmup, WORKER_WARMUP
+
+    if WORKER_WARMUP:
+        # requests that arrive first simply wait on the same per-client locks
+        threading.Thread(target=warmup, name="warmup", daemon=True).start()
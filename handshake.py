@@ -1,11 +1,13 @@
 import asyncio
 import threading
 import websockets
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, abort, stream_with_context
 
-from extractresume import settopics_resume
+from pdftext import read_upload, PDF_MAX_BYTES
+from resumejobs import submit_job, get_job, job_events
 from llmconnection import process_message
-from speechtotext import send_to_assemblyai, run, send_msg_to_llm
+import ttscache
+from speechtotext import send_to_assemblyai, send_msg_to_llm, sessions, resume_session, client_user_id
 from flask_cors import CORS
 import subprocess
 import time
@@ -19,18 +21,26 @@ process = psutil.Process(os.getpid())
 # ------------------- WebSocket Handler -------------------
 async def handler(websocket):
     print("🔗 Client connected")
-    global stopmsgtollm
+    user_id = client_user_id(websocket)
+    if not user_id:
+        await websocket.close(code=1008, reason="userId is required")
+        return
+
+    try:
+        await sessions.open(user_id, client=websocket)
+    except Exception as e:
+        print(f"❌ Could not open AssemblyAI stream for {user_id}: {e}")
+        await websocket.close(code=1011, reason="speech-to-text unavailable")
+        return
+
     try:
         async for message in websocket:
-            if not stopmsgtollm:
-                if isinstance(message, (bytes, bytearray)):
-                    send_to_assemblyai(message, is_binary=True)
-                else:
-                    send_to_assemblyai(message)
-            else:
-                print("⚠️ Message to LLM is stopped (stopmsgtollm=True)")
+            # bytes are relayed as binary audio frames, str as control messages
+            await send_to_assemblyai(user_id, message)
     except websockets.exceptions.ConnectionClosed as e:
         print("❌ Client disconnected:", e)
+    finally:
+        await sessions.close(user_id, client=websocket)
 
 
 # ------------------- Flask API -------------------
@@ -46,8 +56,6 @@ CORS(
     }
 )
 
-stopmsgtollm = False
-
 
 @app.route("/api/v1/resume/topics", methods=["POST"])
 def extract_topics_from_resume():
@@ -70,14 +78,35 @@ def extract_topics_from_resume():
     if not resume_file.filename.lower().endswith(".pdf"):
         return jsonify({"error": "Only PDF files are allowed"}), 400
 
-    response = settopics_resume(
-        user_id=user_id,
-        job_description=job_description,
-        resume_file=resume_file
+    # 3. Queue the analysis (PDF parsing + LLM calls) and answer right away
+    pdf_bytes = read_upload(resume_file)
+    if len(pdf_bytes) > PDF_MAX_BYTES:
+        return jsonify({"error": f"PDF is larger than {PDF_MAX_BYTES // (1024 * 1024)} MB"}), 413
+
+    job_id = submit_job(user_id, job_description, pdf_bytes)
+    status_url = f"/api/v1/resume/jobs/{job_id}"
+    return jsonify({
+        "jobId": job_id,
+        "status": "queued",
+        "statusUrl": status_url,
+        "eventsUrl": f"{status_url}/events",
+    }), 202, {"Location": status_url}
+
+@app.route("/api/v1/resume/jobs/<job_id>", methods=["GET"])
+def get_resume_job(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify({"jobId": job_id, **job})
+
+@app.route("/api/v1/resume/jobs/<job_id>/events", methods=["GET"])
+def resume_job_events(job_id):
+    return Response(
+        stream_with_context(job_events(job_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-    return response
-
 @app.after_request
 def track_memory(response):
     rss_mb = process.memory_info().rss / 1024 / 1024
@@ -94,18 +123,35 @@ def send_msg_api():
     if not user_id:
         return jsonify({"error": "userId is required"}), 400
 
-    response = send_msg_to_llm(user_id)
+    response = send_msg_to_llm(
+        user_id,
+        stream=bool(data.get("stream")),
+        delivery=data.get("delivery")
+    )
     return response
 
+@app.route("/audio/<audio_id>", methods=["GET"])
+def get_audio(audio_id):
+    # audio ids are TTS cache keys (sha256 hex); send_file handles Range requests
+    if len(audio_id) != 64 or any(c not in "0123456789abcdef" for c in audio_id):
+        abort(404)
+    path = ttscache.audio_path(audio_id)
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype="audio/mpeg", conditional=True, max_age=86400)
+
 @app.route("/test", methods=["POST"])
 def test():
     return "test success"
 
 @app.route("/api/v1//reconnect", methods=["POST"])
 def reconnect():
-    global stopmsgtollm
-    stopmsgtollm = False
-    return jsonify({"success": True, "stopmsgtollm": stopmsgtollm})
+    # userId is optional: the pause after a question now lifts by itself once
+    # its audio has played, so a bare call (older clients) is a harmless no-op
+    data = request.get_json(silent=True) or {}
+    user_id = data.get("userId")
+    resumed = resume_session(user_id) if user_id else True
+    return jsonify({"success": resumed, "stopmsgtollm": False})
 
 
 def run_flask():
@@ -119,9 +165,6 @@ async def main():
     flask_thread = threading.Thread(target=run_flask, daemon=True)
     flask_thread.start()
 
-    stt_thread = threading.Thread(target=run, daemon=True)
-    stt_thread.start()
-
     async with websockets.serve(handler, "0.0.0.0", 8001):
         print("✅ WebSocket server started at ws://0.0.0.0:8001")
         await asyncio.Future()
@@ -5,7 +5,7 @@ import subprocess
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from llmconnection import process_message
-from speechtotext import send_to_assemblyai, run, send_msg_to_llm
+from speechtotext import send_to_assemblyai, send_msg_to_llm, sessions, resume_session, client_user_id
 import time
 
 # ------------------- Flask -------------------
@@ -13,8 +13,6 @@ app = Flask(__name__)
 application = app  # EB uses this
 CORS(app)
 
-stopmsgtollm = False
-
 @app.route("/", methods=["GET"])
 def root():
     return "App is running!"
@@ -25,27 +23,44 @@ def send_msg_api():
     user_id = data.get("userId")
     if not user_id:
         return jsonify({"error": "userId is required"}), 400
-    response = send_msg_to_llm(user_id)
+    response = send_msg_to_llm(
+        user_id,
+        stream=bool(data.get("stream")),
+        delivery=data.get("delivery")
+    )
     return response
 
 @app.route("/reconnect", methods=["POST"])
 def reconnect():
-    global stopmsgtollm
-    stopmsgtollm = False
-    return jsonify({"success": True, "stopmsgtollm": stopmsgtollm})
+    # userId is optional: the pause after a question now lifts by itself once
+    # its audio has played, so a bare call (older clients) is a harmless no-op
+    data = request.get_json(silent=True) or {}
+    user_id = data.get("userId")
+    resumed = resume_session(user_id) if user_id else True
+    return jsonify({"success": resumed, "stopmsgtollm": False})
 
 # ------------------- WebSocket -------------------
 async def ws_handler(websocket):
-    global stopmsgtollm
+    user_id = client_user_id(websocket)
+    if not user_id:
+        await websocket.close(code=1008, reason="userId is required")
+        return
+
+    try:
+        await sessions.open(user_id, client=websocket)
+    except Exception as e:
+        print(f"❌ Could not open AssemblyAI stream for {user_id}: {e}")
+        await websocket.close(code=1011, reason="speech-to-text unavailable")
+        return
+
     try:
         async for message in websocket:
-            if not stopmsgtollm:
-                if isinstance(message, (bytes, bytearray)):
-                    send_to_assemblyai(message, is_binary=True)
-                else:
-                    send_to_assemblyai(message)
+            # bytes are relayed as binary audio frames, str as control messages
+            await send_to_assemblyai(user_id, message)
     except Exception as e:
         print("WebSocket error:", e)
+    finally:
+        await sessions.close(user_id, client=websocket)
 
 async def start_websocket():
     await websockets.serve(ws_handler, "0.0.0.0", 8001)
@@ -55,17 +70,10 @@ def run_ws_thread():
     t = threading.Thread(target=lambda: asyncio.run(start_websocket()), daemon=True)
     t.start()
 
-
-
-def run_stt_thread():
-    t = threading.Thread(target=run, daemon=True)
-    t.start()
-
 # ------------------- Main -------------------
 if __name__ == "__main__":
     # Start background tasks
     run_ws_thread()
-    run_stt_thread()
 
     # Run Flask in main thread (EB tracks this as the PID)
     port = int(os.environ.get("PORT", 5000))
@@ -0,0 +1,59 @@
+import json
+
+import redis
+
+from redisclient import redis_client
+
+# ---------------- Config ---------------- #
+STATE_TTL = 86400           # same lifetime as the candidate's question structure
+REDIS_PREFIX = "interview_state:"
+MAX_RETRIES = 10            # optimistic-lock attempts before giving up on a turn
+
+
+class StateConflict(Exception):
+    """Another worker kept updating the same interview for MAX_RETRIES attempts."""
+
+
+def state_key(user_id):
+    return f"{REDIS_PREFIX}{user_id}"
+
+
+# ---------------- Per-candidate Interview State ---------------- #
+# One compact JSON record per candidate, so any worker can serve any turn:
+#   {"v": version, "cursor": {...}, "q": last question asked, "eval": {...}}
+def decode_state(raw):
+    return json.loads(raw) if raw else None
+
+
+def load_state(user_id):
+    """Current record for this candidate, or None before the first question."""
+    return decode_state(redis_client.get(state_key(user_id)))
+
+
+def update_state(user_id, mutate):
+    """
+    Optimistic read-modify-write: WATCH the record, build the next one with
+    mutate(current) (current is None for a new interview), and commit it in
+    MULTI/EXEC. If another worker commits in between, re-read and retry, so
+    mutate must be cheap and free of side effects. Returns the committed record.
+    """
+    key = state_key(user_id)
+    with redis_client.pipeline() as pipe:
+        for _ in range(MAX_RETRIES):
+            try:
+                pipe.watch(key)
+                current = decode_state(pipe.get(key))
+                state = mutate(current)
+                state["v"] = (current or {}).get("v", 0) + 1
+                pipe.multi()
+                pipe.set(key, json.dumps(state, separators=(",", ":")), ex=STATE_TTL)
+                pipe.execute()
+                return state
+            except redis.WatchError:
+                continue
+    raise StateConflict(f"interview state for {user_id} kept changing")
+
+
+def clear_state(user_id, pipe=None):
+    """Forget the interview (e.g. a new resume was uploaded); pipe batches it with other writes."""
+    (pipe or redis_client).delete(state_key(user_id))
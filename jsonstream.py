@@ -0,0 +1,137 @@
+import json
+
+_WHITESPACE = " \t\r\n"
+_MISSING = object()
+
+
+# ---------------- Incremental JSON Parser ---------------- #
+class JSONStreamParser:
+    """
+    Consumes an LLM's JSON answer chunk by chunk and reports each entry as
+    soon as it is complete, without waiting for the rest of the document.
+
+    An entry is (path, value): path is the tuple of keys/indexes from the root,
+    e.g. ("topicsToEvaluate", "Java") -> ["OOP", "Collections"]. Only entries
+    at most max_depth deep are decoded and reported. Text before the first
+    { or [ and after the root closes (prose, ``` fences) is ignored.
+    """
+
+    def __init__(self, on_entry=None, max_depth=1):
+        self.on_entry = on_entry
+        self.max_depth = max_depth
+        self.text = ""
+        self.value = _MISSING
+        self._pos = 0
+        self._stack = []             # open containers: {"kind", "path", "key", "index", "expect", "start"}
+        self._root_start = None
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+
+    @property
+    def done(self):
+        return self.value is not _MISSING
+
+    def feed(self, chunk):
+        """Add text; returns the entries completed by it (also passed to on_entry)."""
+        completed = []
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            c = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame["kind"] == "{" and frame["expect"] == "key":
+                        frame["key"] = json.loads(text[self._string_start:i + 1])
+                continue
+
+            if self._root_start is None:
+                if c in "{[":
+                    self._root_start = i
+                    self._open(c, ())
+                continue
+
+            if c in _WHITESPACE:
+                continue
+            frame = self._stack[-1]
+
+            if c in "}]":
+                if frame["start"] is not None:
+                    self._complete(frame, i, completed)
+                self._stack.pop()
+                if not self._stack:
+                    self.value = json.loads(text[self._root_start:i + 1])
+                else:
+                    self._complete(self._stack[-1], i + 1, completed)
+            elif c == ",":
+                if frame["start"] is not None:
+                    self._complete(frame, i, completed)
+                frame["expect"] = "key" if frame["kind"] == "{" else "value"
+            elif c == ":" and frame["kind"] == "{":
+                frame["expect"] = "value"
+            else:
+                if c == '"':
+                    self._in_string = True
+                    self._string_start = i
+                if frame["expect"] == "value" and frame["start"] is None:
+                    frame["start"] = i
+                    if c in "{[":
+                        key = frame["key"] if frame["kind"] == "{" else frame["index"]
+                        self._open(c, frame["path"] + (key,))
+        self._pos = len(text)
+        return completed
+
+    def consume(self, chunks):
+        """Feed an iterable of text chunks (or LangChain message chunks); returns close()."""
+        for chunk in chunks:
+            content = getattr(chunk, "content", chunk)
+            if content:
+                self.feed(content)
+            if self.done:
+                break
+        return self.close()
+
+    def close(self):
+        """The whole document; ValueError if the stream ended before the root closed."""
+        if not self.done:
+            raise ValueError(f"Incomplete JSON in model output: {self.text[:500]}")
+        return self.value
+
+    def _open(self, kind, path):
+        self._stack.append({
+            "kind": kind, "path": path, "key": None, "index": 0,
+            "expect": "key" if kind == "{" else "value", "start": None,
+        })
+
+    def _complete(self, frame, end, completed):
+        raw = self.text[frame["start"]:end]
+        frame["start"] = None
+        frame["expect"] = None
+        if frame["kind"] == "{":
+            path = frame["path"] + (frame["key"],)
+        else:
+            path = frame["path"] + (frame["index"],)
+            frame["index"] += 1
+        if len(path) > self.max_depth:
+            return
+        entry = (path, json.loads(raw))
+        completed.append(entry)
+        if self.on_entry is not None:
+            self.on_entry(*entry)
+
+
+# ---------------- Helpers ---------------- #
+def parse_json_response(text):
+    """First complete JSON object/array in a model's reply, ignoring surrounding prose."""
+    parser = JSONStreamParser(max_depth=0)
+    parser.feed(text)
+    return parser.close()
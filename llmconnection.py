@@ -1,6 +1,7 @@
 import os
 import re
 import time
+import threading
 from dotenv import load_dotenv
 
 from langchain_openai import ChatOpenAI
@@ -12,15 +13,6 @@ from langchain_core.messages import AIMessage, HumanMessage
 # ---------------- ENV ----------------
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("❌ OPENAI_API_KEY not found. Set it in .env")
-
-# ---------------- MODEL (LOAD ONCE) ----------------
-chat_model = ChatOpenAI(
-    model="gpt-4o-mini",
-    api_key=api_key,
-    temperature=0.7
-)
 
 # ---------------- SESSION MEMORY ----------------
 sessions_memory = {}
@@ -73,13 +65,30 @@ prompt = ChatPromptTemplate.from_messages([
     ("human", "{message}")
 ])
 
-# ---------------- CHAIN (FIXED) ----------------
-chat_chain = RunnableWithMessageHistory(
-    prompt | chat_model,
-    get_session_history,
-    input_messages_key="message",
-    history_messages_key="history"
-)
+# ---------------- MODEL + CHAIN (LOAD ONCE, ON FIRST USE) ----------------
+_chat_chain = None
+_chain_lock = threading.Lock()
+
+
+def get_chat_chain():
+    global _chat_chain
+    if _chat_chain is None:
+        with _chain_lock:
+            if _chat_chain is None:
+                if not api_key:
+                    raise ValueError("❌ OPENAI_API_KEY not found. Set it in .env")
+                chat_model = ChatOpenAI(
+                    model="gpt-4o-mini",
+                    api_key=api_key,
+                    temperature=0.7
+                )
+                _chat_chain = RunnableWithMessageHistory(
+                    prompt | chat_model,
+                    get_session_history,
+                    input_messages_key="message",
+                    history_messages_key="history"
+                )
+    return _chat_chain
 
 # ---------------- HELPERS ----------------
 def clean_response(text: str) -> str:
@@ -87,8 +96,24 @@ def clean_response(text: str) -> str:
     return re.sub(r"\s+", " ", cleaned).strip()
 
 # ---------------- API ENTRY ----------------
-def process_message(message: str, session_id: str) -> str:
+def process_message(message: str, session_id: str, on_token=None) -> str:
+    """
+    on_token (optional) receives completion tokens as they stream in, so TTS
+    can start on the first sentence before the reply is finished.
+    """
     try:
+        chat_chain = get_chat_chain()
+        if on_token is not None:
+            parts = []
+            for chunk in chat_chain.stream(
+                {"message": message},
+                config={"configurable": {"session_id": session_id}}
+            ):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    on_token(chunk.content)
+            return clean_response("".join(parts))
+
         response = chat_chain.invoke(
             {"message": message},
             config={"configurable": {"session_id": session_id}}
@@ -1,6 +1,17 @@
 from langchain_core.prompts import PromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage
+from concurrent.futures import ThreadPoolExecutor
 import json
+import os
+
+from jsonstream import parse_json_response
+
+# Per-skill fan-out: one small prompt per skill, run concurrently
+PATTERN_FANOUT = os.getenv("PATTERN_FANOUT", "true").lower() == "true"
+PATTERN_CONCURRENCY = int(os.getenv("PATTERN_CONCURRENCY", "4"))   # in-flight skill prompts, process-wide
+CHUNK_ATTEMPTS = 3      # a malformed or failed skill is retried on its own
+
+pattern_pool = ThreadPoolExecutor(max_workers=PATTERN_CONCURRENCY, thread_name_prefix="pattern-skill")
 
 prompt_template_pattern = PromptTemplate(
     input_variables=["topics_json", "experience"],
@@ -48,10 +59,7 @@ Experience: {experience}
 """
 )
 
-def generate_question_patterns(parsed_topics_json, llm):
-    topics_dict = parsed_topics_json.get("topicsToEvaluate", {})
-    experience = parsed_topics_json.get("experienceYears", 1)
-
+def _request_patterns(topics_dict, experience, llm):
     topics_json = json.dumps(topics_dict, indent=2)
 
     prompt = prompt_template_pattern.format(
@@ -64,15 +72,54 @@ def generate_question_patterns(parsed_topics_json, llm):
         HumanMessage(content=prompt)
     ]
 
-    response = llm.invoke(messages)
+    # JSON mode: the model must answer with a single JSON object
+    response = llm.bind(response_format={"type": "json_object"}).invoke(messages)
 
     try:
-        content = response.content.strip()
-        start_idx = content.find("{")
-        end_idx = content.rfind("}") + 1
-        parsed_json = json.loads(content[start_idx:end_idx])
-    except Exception:
+        parsed_json = parse_json_response(response.content)
+    except ValueError:
         raise ValueError(f"Failed to parse question patterns: {response.content}")
 
     return parsed_json.get("questionPatterns", {})
 
+
+def _skill_patterns(skill, topics, experience, llm):
+    for attempt in range(1, CHUNK_ATTEMPTS + 1):
+        try:
+            return _request_patterns({skill: topics}, experience, llm)
+        except Exception as e:
+            print(f"⚠️ Patterns for '{skill}' failed (attempt {attempt}/{CHUNK_ATTEMPTS}): {e}")
+    return None
+
+
+def start_skill_patterns(skill, topics, experience, llm):
+    """Queue one skill's pattern prompt; returns (skill, future) for collect_skill_patterns."""
+    return skill, pattern_pool.submit(_skill_patterns, skill, topics, experience, llm)
+
+
+def generate_question_patterns(parsed_topics_json, llm):
+    topics_dict = parsed_topics_json.get("topicsToEvaluate", {})
+    experience = parsed_topics_json.get("experienceYears", 1)
+
+    if not PATTERN_FANOUT or len(topics_dict) < 2:
+        return _request_patterns(topics_dict, experience, llm)
+
+    return collect_skill_patterns([
+        start_skill_patterns(skill, topics, experience, llm)
+        for skill, topics in topics_dict.items()
+    ])
+
+
+def collect_skill_patterns(futures):
+    # merge in resume order; a skill that still fails after its retries is left out
+    question_patterns = {}
+    for skill, future in futures:
+        patterns = future.result()
+        if patterns is None:
+            print(f"❌ Dropping skill '{skill}' from question patterns")
+            continue
+        question_patterns.update(patterns)
+
+    if not question_patterns:
+        raise ValueError("Failed to generate question patterns for any skill")
+    return question_patterns
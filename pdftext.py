@@ -0,0 +1,112 @@
+import io
+import os
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import PyPDF2
+import redis
+
+from redisclient import redis_client
+
+# ---------------- Config ---------------- #
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(10 * 1024 * 1024)))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "20"))          # a resume longer than this is truncated
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "60000"))       # ~15k tokens of prompt, at most
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARALLEL_MIN_PAGES = 4         # below this the process hop costs more than it saves
+EXTRACT_TIMEOUT = 30           # seconds for the whole document
+CACHE_TTL = 7 * 86400
+REDIS_PREFIX = "pdf_text:"
+
+
+class PDFTooLarge(ValueError):
+    pass
+
+
+# ---------------- Process Pool ---------------- #
+# spawn, not fork: the parent is a threaded gunicorn worker. spawn re-imports
+# __main__ in each child: under gunicorn that is only its entry script, so the
+# children stay light; started as `python handshake.py` it is the whole app.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _extract_range(data, start, stop):
+    """Worker: text of pages [start, stop). Re-parses the bytes, since readers do not pickle."""
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _page_ranges(n_pages, n_chunks):
+    step = -(-n_pages // n_chunks)
+    return [(start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+
+
+# ---------------- Extraction ---------------- #
+def pdf_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def extract_pdf_text(data, use_cache=True):
+    """
+    Text of a PDF given as bytes, at most PDF_MAX_PAGES pages / PDF_MAX_CHARS
+    characters. Cached in Redis by the file's SHA-256, so a re-upload of the
+    same resume skips parsing.
+    """
+    if len(data) > PDF_MAX_BYTES:
+        raise PDFTooLarge(f"PDF is larger than {PDF_MAX_BYTES // (1024 * 1024)} MB")
+
+    key = REDIS_PREFIX + pdf_key(data)
+    if use_cache:
+        try:
+            cached = redis_client.get(key)
+            if cached is not None:
+                return cached
+        except redis.RedisError as e:
+            print(f"⚠️ PDF text cache unavailable: {e}")
+
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    n_pages = min(len(reader.pages), PDF_MAX_PAGES)
+
+    if n_pages < PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+        pages = [reader.pages[i].extract_text() or "" for i in range(n_pages)]
+    else:
+        pool = _get_pool()
+        futures = [pool.submit(_extract_range, data, start, stop)
+                   for start, stop in _page_ranges(n_pages, PDF_WORKERS)]
+        # one deadline for all chunks, not EXTRACT_TIMEOUT per chunk
+        _, not_done = wait(futures, timeout=EXTRACT_TIMEOUT)
+        if not_done:
+            for f in not_done:
+                f.cancel()
+            raise TimeoutError(f"PDF text extraction took longer than {EXTRACT_TIMEOUT}s")
+        pages = [page for f in futures for page in f.result()]
+
+    text = "\n".join(pages).strip()[:PDF_MAX_CHARS]
+
+    if use_cache:
+        try:
+            redis_client.set(key, text, ex=CACHE_TTL)
+        except redis.RedisError as e:
+            print(f"⚠️ PDF text cache unavailable: {e}")
+    return text
+
+
+def read_upload(file):
+    """Bytes of an uploaded file (or path), reading at most one byte past PDF_MAX_BYTES."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            return f.read(PDF_MAX_BYTES + 1)
+    return file.read(PDF_MAX_BYTES + 1)
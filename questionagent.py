@@ -1,41 +1,50 @@
 import os
 import json
+import time
 import openai
-import redis
+import numpy as np
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 from threading import Lock
-
-# ----------- Pinecone v3+ Correct Import ----------- #
-from pinecone import Pinecone, ServerlessSpec
+from concurrent.futures import ThreadPoolExecutor
 
 from evaluation_agent import EvaluationAgent
-
-
-# ---------------- Redis Setup ---------------- #
-redis_client = redis.Redis(
-    host='localhost',
-    port=6379,
-    db=0,
-    decode_responses=True
-)
+from embeddings import embed_text, embed_texts
+from vectorstore import get_index, INDEX_NAME
+from summarycache import get_summary_or_latest
+from redisclient import redis_client
+from interviewstate import state_key, decode_state, update_state
 
 # ---------------- Flask + OpenAI + Pinecone Setup ---------------- #
 load_dotenv()
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# Initialize Pinecone client
-pc = Pinecone(api_key=os.getenv("PINECONE_API"))
-INDEX_NAME = "topic-summary"
-index = pc.Index(INDEX_NAME)   # global index reference
-
 app = Flask(__name__)
 agent_lock = Lock()
-agents = {}
+# Per-process caches only; the interview itself lives in Redis (interviewstate),
+# so any worker can serve any turn
+agents = {}       # user_id -> QuestionPatternAgent (kept for its prefetch)
 evaluators = {}   # user_id -> EvaluationAgent instance
-question_asked = None
 
+INTERVIEW_COMPLETED = "✅ Interview Completed!"
+
+ASKED_PREFIX = "asked_questions_z:"     # sorted sets (the old asked_questions:* keys were lists)
+ASKED_QUESTIONS_MAX = 50
+ASKED_QUESTIONS_TTL = 86400
+
+# ---------------- Candidate Generation ---------------- #
+QUESTION_CANDIDATES = int(os.getenv("QUESTION_CANDIDATES", "3"))   # choices per completion call
+CANDIDATE_TEMPERATURE = 0.9          # spread the choices out a little
+NEAR_DUPLICATE_SIMILARITY = 0.92     # only logged: every candidate is this close to an asked question
+
+# ---------------- Speculative Prefetch ---------------- #
+# While the candidate answers, generate (and pre-synthesize) the next question.
+PREFETCH_ENABLED = os.getenv("QUESTION_PREFETCH", "true").lower() == "true"
+PREFETCH_TTS = os.getenv("QUESTION_PREFETCH_TTS", "true").lower() == "true"
+FOLLOW_UP_MIN_WORDS = 8    # a same-topic answer this long gets a fresh follow-up instead
+prefetch_pool = ThreadPoolExecutor(max_workers=int(os.getenv("PREFETCH_WORKERS", "4")),
+                                   thread_name_prefix="question-prefetch")
 
 
 # ---------------- MAIN QUESTION GENERATOR ---------------- #
@@ -53,6 +62,8 @@ class QuestionPatternAgent:
         self.current_pattern_index = 0
         self.question_count = 0
         self.topics = list(self.structure[self.current_domain].keys())
+        self.prefetched = None   # {"slot": (domain, topic, pattern), "future": Future}
+        self.state_version = 0   # version of the shared state this cursor was loaded from
 
     def _get_current_topic(self):
         return self.topics[self.current_topic_index]
@@ -78,68 +89,102 @@ class QuestionPatternAgent:
             else:
                 self.current_domain = None
 
+    def _advance(self):
+        self.question_count += 1
+        self.current_pattern_index += 1
+
+        if self.question_count >= self.max_questions_per_topic:
+            self._move_to_next_topic()
+
+    # ----------------- Shared State ----------------- #
+    def to_state(self):
+        return {
+            "d": self.current_domain,
+            "t": self.current_topic_index,
+            "p": self.current_pattern_index,
+            "c": self.question_count,
+        }
+
+    def load_state(self, cursor):
+        domain = cursor["d"]
+        if domain is not None and (domain not in self.structure
+                                   or cursor["t"] >= len(self.structure[domain])):
+            # cursor from another question structure (e.g. before a re-upload): start over
+            print(f"⚠️ Stale interview cursor for {self.user_id}, restarting at the first topic")
+            self.current_domain = list(self.structure.keys())[0]
+            self.topics = list(self.structure[self.current_domain].keys())
+            self.current_topic_index = self.current_pattern_index = self.question_count = 0
+            return
+
+        self.current_domain = domain
+        self.current_topic_index = cursor["t"]
+        self.current_pattern_index = cursor["p"]
+        self.question_count = cursor["c"]
+        if self.current_domain:
+            self.topics = list(self.structure[self.current_domain].keys())
+
 
     # ----------------- Redis Storage ----------------- #
+    # Sorted set per (user, topic), scored by time: bounded to the newest
+    # ASKED_QUESTIONS_MAX and expiring with the rest of the interview.
+    def _asked_key(self, topic):
+        return f"{ASKED_PREFIX}{self.user_id}:{topic}"
+
     def _get_asked_questions(self, topic):
-        redis_key = f"asked_questions:{self.user_id}:{topic}"
-        return redis_client.lrange(redis_key, 0, -1) or []
+        return redis_client.zrange(self._asked_key(topic), 0, -1) or []
 
     def _store_asked_question(self, topic, question):
-        redis_key = f"asked_questions:{self.user_id}:{topic}"
-        redis_client.rpush(redis_key, question)
+        redis_key = self._asked_key(topic)
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zadd(redis_key, {question: time.time()})
+        pipe.zremrangebyrank(redis_key, 0, -ASKED_QUESTIONS_MAX - 1)
+        pipe.expire(redis_key, ASKED_QUESTIONS_TTL)
+        pipe.execute()
 
 
     # ---------------- Embedding ---------------- #
     def _embed_text(self, text):
         try:
-            response = openai.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
-            )
-            vector = response.data[0].embedding
-
-            # ensure 1024 vector dimension
-            expected_dim = 1024
-            if len(vector) != expected_dim:
-                if len(vector) > expected_dim:
-                    vector = vector[:expected_dim]
-                else:
-                    vector += [0.0] * (expected_dim - len(vector))
-
-            return vector
+            return embed_text(text).tolist()
 
         except Exception as e:
             print(f"⚠️ Embedding Error: {e}")
             return None
 
 
-    # ---------------- Question Generation ---------------- #
-    def _generate_question_from_llm(self, domain, topic, pattern_type, previous_answer=None):
+    # ---------------- Topic Summary ---------------- #
+    def _get_topic_summary(self, topic):
+        # background evaluations land here; use whatever is already available
+        cached = get_summary_or_latest(self.user_id, topic)
+        if cached is not None:
+            return cached.get("summary", ""), cached.get("weak_areas", [])
 
-        # 🔥 Query Pinecone for summary context
         try:
             topic_vector = self._embed_text(topic)
 
-            pinecone_result = index.query(
+            # shared vector index (Pinecone or local), connected on first use
+            pinecone_result = get_index(INDEX_NAME).query(
                 vector=topic_vector,
                 top_k=1,
                 include_metadata=True,
-                filter={"type": "summary"}
+                filter={"type": "summary", "user_id": self.user_id}
             )
 
-            topic_summary = ""
-            weak_areas = []
-
             if pinecone_result.matches:
                 meta = pinecone_result.matches[0].metadata
-                topic_summary = meta.get("summary", "")
-                weak_areas = meta.get("weak_areas", [])
+                return meta.get("summary", ""), meta.get("weak_areas", [])
 
         except Exception as e:
             print(f"⚠️ Pinecone retrieval failed: {e}")
-            topic_summary = ""
-            weak_areas = []
 
+        return "", []
+
+
+    # ---------------- Question Generation ---------------- #
+    def _build_question_messages(self, domain, topic, pattern_type, previous_answer=None):
+
+        # 🔥 Summary context: per-(user, topic) cache, vector search only on a miss
+        topic_summary, weak_areas = self._get_topic_summary(topic)
 
         summary_context = ""
         if topic_summary or weak_areas:
@@ -162,13 +207,33 @@ Topic: {topic} ({domain})
 Return ***only the question***.
 """
 
+        return [
+            {"role": "system", "content": "You are a strict interviewer."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _generate_question_from_llm(self, domain, topic, pattern_type, previous_answer=None, on_token=None):
+        """
+        With on_token, the completion is streamed and each token is handed to
+        on_token as it arrives (e.g. a TTSSentenceStream.feed); the full text is
+        still returned.
+        """
+        messages = self._build_question_messages(domain, topic, pattern_type, previous_answer)
+
         try:
+            if on_token is not None:
+                parts = []
+                stream = openai.chat.completions.create(model="gpt-4o-mini", messages=messages, stream=True)
+                for event in stream:
+                    delta = event.choices[0].delta.content if event.choices else None
+                    if delta:
+                        parts.append(delta)
+                        on_token(delta)
+                return "".join(parts).strip()
+
             response = openai.chat.completions.create(
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a strict interviewer."},
-                    {"role": "user", "content": prompt}
-                ]
+                messages=messages
             )
 
             return response.choices[0].message.content.strip()
@@ -176,45 +241,172 @@ Return ***only the question***.
         except Exception as e:
             return f"⚠️ LLM Error: {str(e)}"
 
+    def _generate_question_candidates(self, domain, topic, pattern_type, previous_answer=None):
+        """QUESTION_CANDIDATES alternative questions from a single completion call (n choices)."""
+        messages = self._build_question_messages(domain, topic, pattern_type, previous_answer)
+
+        try:
+            response = openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                n=QUESTION_CANDIDATES,
+                temperature=CANDIDATE_TEMPERATURE
+            )
+            candidates = [c.message.content.strip() for c in response.choices if c.message.content]
+            return list(dict.fromkeys(c for c in candidates if c))
+
+        except Exception as e:
+            return [f"⚠️ LLM Error: {str(e)}"]
+
+
+    # ---------------- Semantic Dedupe ---------------- #
+    @staticmethod
+    def _pick_least_similar(candidates, asked):
+        """
+        Candidate whose closest previously-asked question is furthest away
+        (cosine over cached embeddings). Exact repeats score 1.0 and lose.
+        """
+        if len(candidates) == 1 or not asked:
+            return candidates[0]
+        try:
+            vectors = np.stack(embed_texts(candidates + list(asked)))
+        except Exception as e:
+            print(f"⚠️ Dedupe embedding failed, using exact match: {e}")
+            fresh = [c for c in candidates if c not in asked]
+            return fresh[0] if fresh else candidates[0]
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        similarity = vectors[:len(candidates)] @ vectors[len(candidates):].T   # candidates x asked
+        closest = similarity.max(axis=1)
+        best = int(np.argmin(closest))
+        if closest[best] >= NEAR_DUPLICATE_SIMILARITY:
+            print(f"⚠️ All candidates are near-duplicates (best similarity {closest[best]:.2f})")
+        return candidates[best]
+
+    def _generate_distinct_question(self, domain, topic, pattern_type, previous_answer=None, asked=None):
+        candidates = self._generate_question_candidates(domain, topic, pattern_type, previous_answer)
+        if asked is None:
+            asked = self._get_asked_questions(topic)
+        return self._pick_least_similar(candidates, asked)
+
+
+    # ---------------- Prefetch ---------------- #
+    def _prefetch_job(self, domain, topic, pattern_type):
+        question = self._generate_distinct_question(domain, topic, pattern_type)
+        if PREFETCH_TTS and question and not question.startswith("⚠️"):
+            from texttospeech import synthesize   # warms the TTS cache for this question
+            try:
+                synthesize(question)
+            except Exception as e:
+                print(f"⚠️ Prefetch TTS failed: {e}")
+        return question
+
+    def _start_prefetch(self):
+        self.prefetched = None
+        if not PREFETCH_ENABLED or not self.current_domain:
+            return
+        if self.question_count > 0:
+            # same-topic slot: likely a follow-up on the answer, which a prefetch can't know
+            return
+        slot = (self.current_domain, self._get_current_topic(), self._get_current_pattern())
+        self.prefetched = {"slot": slot, "future": prefetch_pool.submit(self._prefetch_job, *slot)}
+
+    def _needs_follow_up(self, previous_answer):
+        """A follow-up is only worth regenerating for within the same topic after a real answer."""
+        if self.question_count == 0 or not previous_answer:
+            return False
+        return len(previous_answer.split()) >= FOLLOW_UP_MIN_WORDS
+
+    def _take_prefetched(self, slot, asked):
+        prefetched, self.prefetched = self.prefetched, None
+        if not prefetched or prefetched["slot"] != slot:
+            return None
+        try:
+            question = prefetched["future"].result()
+        except Exception as e:
+            print(f"⚠️ Prefetch failed: {e}")
+            return None
+        if not question or question.startswith("⚠️") or question in asked:
+            return None
+        return question
+
 
     # ---------------- Core Public Method ---------------- #
-    def get_question(self, previous_answer=None):
+    def get_question(self, previous_answer=None, on_token=None):
+        """
+        on_token receives the question text as it becomes available: streamed
+        tokens for a live generation, or the whole text for prefetched/canned
+        questions. A streamed question is already being spoken, so it is not
+        regenerated when it repeats an earlier one.
+        """
 
         if not self.current_domain:
-            return {"question": "✅ Interview Completed!"}
+            if on_token is not None:
+                on_token(INTERVIEW_COMPLETED)
+            return {"question": INTERVIEW_COMPLETED}
 
         domain = self.current_domain
         topic = self._get_current_topic()
         pattern_type = self._get_current_pattern()
 
         asked = self._get_asked_questions(topic)
-        attempt = 0
 
-        while attempt < 3:
-            question = self._generate_question_from_llm(domain, topic, pattern_type, previous_answer)
-            if question not in asked:
-                break
-            attempt += 1
+        question = None
+        if not self._needs_follow_up(previous_answer):
+            question = self._take_prefetched((domain, topic, pattern_type), asked)
+        else:
+            self.prefetched = None
 
-        self._store_asked_question(topic, question)
-        self.question_count += 1
-        self.current_pattern_index += 1
+        if question is not None:
+            if on_token is not None:
+                on_token(question)
+        elif on_token is not None:
+            question = self._generate_question_from_llm(domain, topic, pattern_type, previous_answer, on_token)
 
-        if self.question_count >= self.max_questions_per_topic:
-            self._move_to_next_topic()
+        if question is None:
+            question = self._generate_distinct_question(domain, topic, pattern_type, previous_answer, asked)
+
+        self._store_asked_question(topic, question)
+        self._advance()
+        self._start_prefetch()
 
         return {"domain": domain, "topic": topic, "pattern": pattern_type, "question": question}
 
 
 
 # ---------------- API ENTRY ---------------- #
-def get_question_endpoint(user_answer, userid):
-    global question_asked
+def _agent_for(user_id, question_structure, role, exp, state):
+    """Local agent positioned at the shared cursor (reused as-is if it is already there)."""
+    with agent_lock:
+        agent = agents.get(user_id)
+        if agent is None or state is None or agent.structure != question_structure:
+            agent = agents[user_id] = QuestionPatternAgent(
+                question_structure,
+                developer_role=role,
+                experience_level=exp,
+                user_id=user_id
+            )
+        if state is not None and agent.state_version != state["v"]:
+            # another worker served the last turn(s); its prefetch slot check still applies
+            agent.load_state(state["cursor"])
+            agent.state_version = state["v"]
+        return agent
 
+
+def forget_agents(user_id):
+    """Drop this process's cached agents for the candidate (their interview was reset)."""
+    with agent_lock:
+        agents.pop(user_id, None)
+        evaluators.pop(user_id, None)
+
+
+def get_question_endpoint(user_answer, userid, on_token=None):
     user_id = userid
     previous_answer = user_answer  
 
-    data = redis_client.get(user_id)
+    # question structure and interview state in one round trip
+    data, raw_state = redis_client.mget([user_id, state_key(user_id)])
     payload = json.loads(data)
 
     question_structure = payload.get("question")
@@ -223,28 +415,54 @@ def get_question_endpoint(user_answer, userid):
 
     print("getquestion endpoint")
 
-    # Initialize Question Agent if not present
-    with agent_lock:
-        if user_id not in agents:
-            agents[user_id] = QuestionPatternAgent(
-                question_structure,
-                developer_role=role,
-                experience_level=exp,
-                user_id=user_id
-            )
-
-    agent = agents[user_id]
-    result = agent.get_question(previous_answer)
+    # Position a Question Agent at the candidate's shared cursor
+    snapshot = decode_state(raw_state)
+    snapshot_version = snapshot["v"] if snapshot else 0
+    agent = _agent_for(user_id, question_structure, role, exp, snapshot)
+    result = agent.get_question(previous_answer, on_token=on_token)
+    cursor = agent.to_state()
 
 
     # ---------------- Evaluation Agent ---------------- #
-    if user_id not in evaluators:
-        evaluators[user_id] = EvaluationAgent(role=role, experience_level=exp)
-
-    if question_asked:
-        evaluators[user_id].add_question_answer(question_asked, previous_answer, result.get("topic"), user_id)
-
-    question_asked = result.get("question")
+    with agent_lock:
+        if user_id not in evaluators:
+            evaluators[user_id] = EvaluationAgent(role=role, experience_level=exp)
+    evaluator = evaluators[user_id]
+
+    recorded = {}
+
+    def next_state(current):
+        current = current or {"cursor": None, "q": None, "eval": None}
+        next_cursor = cursor
+        if current.get("v", 0) != snapshot_version:
+            # another turn committed while this question was generated: advance from it
+            print(f"⚠️ Concurrent turn for {user_id}, advancing from version {current.get('v')}")
+            latest = QuestionPatternAgent(question_structure, role, exp, user_id=user_id)
+            if current["cursor"]:
+                latest.load_state(current["cursor"])
+            if latest.current_domain and "topic" in result:
+                latest._advance()
+            next_cursor = latest.to_state()
+
+        evaluator.load_state(current["eval"])
+        question_asked = current["q"]
+        recorded.clear()
+        if question_asked and previous_answer and previous_answer.strip():
+            # the closing answer has no next topic; keep it with the pending one
+            topic = result.get("topic") or evaluator.current_topic
+            recorded.update(question=question_asked, topic=topic,
+                            finished=evaluator.record_answer(question_asked, previous_answer, topic))
+
+        return {"cursor": next_cursor, "q": result.get("question"), "eval": evaluator.to_state()}
+
+    state = update_state(user_id, next_state)
+    if state["cursor"] != cursor:
+        agent.load_state(state["cursor"])
+    agent.state_version = state["v"]
+
+    if recorded:
+        evaluator.on_answer_recorded(recorded["question"], previous_answer, recorded["topic"], user_id,
+                                     recorded["finished"])
 
     return result
 
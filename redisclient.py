@@ -0,0 +1,35 @@
+import os
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------------- Config ---------------- #
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))   # per process
+REDIS_POOL_TIMEOUT = 5         # seconds to wait for a free connection before failing
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+HEALTH_CHECK_INTERVAL = 30     # re-ping idle connections before reuse
+
+
+# ---------------- Shared Connection Pools ---------------- #
+# Every module shares these instead of opening its own redis.Redis; pools are
+# thread-safe and connections are only opened on first use.
+def _pool(decode_responses):
+    return redis.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        health_check_interval=HEALTH_CHECK_INTERVAL,
+        decode_responses=decode_responses,
+    )
+
+
+# str in / str out, for JSON records
+redis_client = redis.Redis(connection_pool=_pool(decode_responses=True))
+
+# raw bytes, for binary values such as float32 embeddings
+redis_bytes_client = redis.Redis(connection_pool=_pool(decode_responses=False))
@@ -0,0 +1,104 @@
+import io
+import os
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from redisclient import redis_client
+from extractresume import settopics_resume
+
+# ---------------- Config ---------------- #
+RESUME_JOB_WORKERS = int(os.getenv("RESUME_JOB_WORKERS", "2"))   # uploads processed at once, per process
+JOB_TTL = 3600              # finished jobs can be fetched for an hour
+JOB_PREFIX = "resume_job:"
+EVENT_POLL_INTERVAL = 0.5   # seconds between job store reads for an SSE stream
+EVENT_TIMEOUT = 300         # give up an SSE stream after this long
+KEEPALIVE_INTERVAL = 15     # comment line so proxies keep an idle stream open
+# No heartbeat while a job runs: past these ages its worker is assumed gone
+RUNNING_STALE_AFTER = 300   # PDF parsing + LLM calls finish well within this
+QUEUED_STALE_AFTER = 900    # queued behind a burst on a RESUME_JOB_WORKERS pool
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Separate from the interview pools, so an upload burst queues here instead
+# of delaying question generation or TTS
+resume_job_pool = ThreadPoolExecutor(max_workers=RESUME_JOB_WORKERS, thread_name_prefix="resume-job")
+
+
+def _job_key(job_id):
+    return f"{JOB_PREFIX}{job_id}"
+
+
+def _save(job_id, job):
+    job["updatedAt"] = time.time()
+    redis_client.set(_job_key(job_id), json.dumps(job), ex=JOB_TTL)
+    return job
+
+
+# ---------------- Job Store ---------------- #
+def get_job(job_id):
+    """Job record ({"status", "userId", "result" | "error", ...}) or None if unknown/expired."""
+    raw = redis_client.get(_job_key(job_id))
+    if not raw:
+        return None
+    job = json.loads(raw)
+    stale_after = {QUEUED: QUEUED_STALE_AFTER, RUNNING: RUNNING_STALE_AFTER}.get(job["status"])
+    if stale_after is not None and time.time() - job["updatedAt"] > stale_after:
+        # the process running it crashed or restarted; don't leave clients waiting forever
+        job.update(status=FAILED, error=f"job was {job['status']} for over {stale_after}s and was abandoned",
+                   code=500)
+        _save(job_id, job)
+    return job
+
+
+def submit_job(user_id, job_description, pdf_bytes):
+    """Queue a resume analysis; returns the job id immediately."""
+    job_id = uuid.uuid4().hex
+    job = _save(job_id, {"status": QUEUED, "userId": user_id, "createdAt": time.time()})
+    resume_job_pool.submit(_run_job, job_id, dict(job), job_description, pdf_bytes)
+    return job_id
+
+
+def _run_job(job_id, job, job_description, pdf_bytes):
+    user_id = job["userId"]
+    job["status"] = RUNNING
+    _save(job_id, job)
+    try:
+        response = settopics_resume(
+            user_id=user_id,
+            job_description=job_description,
+            resume_file=io.BytesIO(pdf_bytes)
+        )
+        if isinstance(response, tuple):      # (error body, status code)
+            body, code = response
+            job.update(status=FAILED, error=body.get("error"), code=code)
+        else:
+            job.update(status=DONE, result=response)
+    except Exception as e:
+        print(f"❌ Resume job {job_id} failed: {e}")
+        job.update(status=FAILED, error=str(e), code=500)
+    _save(job_id, job)
+
+
+# ---------------- Server-Sent Events ---------------- #
+def job_events(job_id):
+    """SSE lines for each status change until the job finishes (works from any worker)."""
+    deadline = time.time() + EVENT_TIMEOUT
+    last_status, last_sent = None, time.time()
+    while time.time() < deadline:
+        job = get_job(job_id)
+        if job is None:
+            yield "event: error\ndata: {\"error\": \"job not found\"}\n\n"
+            return
+        if job["status"] != last_status:
+            last_status = job["status"]
+            yield f"event: {last_status}\ndata: {json.dumps(job)}\n\n"
+            last_sent = time.time()
+            if last_status in (DONE, FAILED):
+                return
+        elif time.time() - last_sent >= KEEPALIVE_INTERVAL:
+            yield ": keep-alive\n\n"
+            last_sent = time.time()
+        time.sleep(EVENT_POLL_INTERVAL)
+    yield "event: timeout\ndata: {}\n\n"
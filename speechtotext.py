@@ -1,16 +1,18 @@
-import websocket
+import asyncio
 import json
 import threading
 import time
 import wave
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlparse, parse_qs
 from datetime import datetime
 from llmconnection import process_message
 from flask import Flask, jsonify, request
 
 from questionagent import get_question_endpoint
-from texttospeech import ttsblend
+from texttospeech import ttsblend, ttsblend_binary, synthesize_blend, TTSSentenceStream, AUDIO_DELIVERY
 from dotenv import load_dotenv
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
 import os
 
 
@@ -31,178 +33,318 @@ FRAMES_PER_BUFFER = 800  # 50ms of audio (0.05s * 16000Hz)
 SAMPLE_RATE = CONNECTION_PARAMS["sample_rate"]
 CHANNELS = 1
 
-# Global variables for websocket and state
-ws_app = None
-ws_global = None
-user_prompt = ""
-transcript = ""
-stop_event = threading.Event()  # To signal any background tasks to stop
+# Session housekeeping
+SESSION_TTL = 1800         # drop idle candidate sessions after 30 minutes
+SEND_QUEUE_MAX = 40        # ~2s of 50ms frames buffered per candidate before backpressure
+CLOSE_TIMEOUT = 5          # seconds to let queued audio + Terminate drain on close
+PUSH_TIMEOUT = 10          # seconds a Flask thread waits for a frame to reach the client
+PLAYBACK_GRACE = 1.0       # extra seconds of pause after a question's audio, for client latency
 
 # (No local audio capture on backend; frontend should send audio to this service.)
 
 
-# --- WebSocket Send Function ---
-
-def send_to_assemblyai(data, is_binary=False):
-    """
-    Send data to AssemblyAI via WebSocket, unless stopmsgtollm is True.
+# ---------------- Per-candidate STT Session ---------------- #
+class STTSession:
     """
-    global ws_global, stopmsgtollm
+    One upstream AssemblyAI stream plus the transcript and pause state
+    of a single candidate (keyed by userId).
 
+    Runs on the same asyncio loop as the client websocket server: audio is
+    put on a bounded queue and a sender task relays it upstream, so a slow
+    AssemblyAI socket only slows this candidate's reader, never the loop.
+    """
 
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.upstream = None
+        self.queue = None
+        self.tasks = []
+        self.loop = None
+        self.client = None        # the candidate's own websocket (port 8001), for server pushes
+        self.open_lock = asyncio.Lock()
+        self.user_prompt = ""
+        self.transcript = ""
+        self.paused_until = 0.0   # mic muted while the question plays (was global stopmsgtollm)
+        self.last_used = time.time()
+
+    # --- Pause ---
+    @property
+    def paused(self):
+        return time.time() < self.paused_until
+
+    def pause(self, seconds):
+        """Stop relaying audio for seconds; it resumes by itself afterwards."""
+        self.paused_until = time.time() + seconds
+
+    def resume(self):
+        self.paused_until = 0.0
+
+    # --- Lifecycle ---
+    async def start(self):
+        for task in self.tasks:
+            task.cancel()
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SEND_QUEUE_MAX)
+        self.upstream = await connect(
+            API_ENDPOINT,
+            additional_headers={"Authorization": api_key},
+        )
+        print(f"WebSocket connection opened (user={self.user_id}).")
+        self.tasks = [
+            asyncio.create_task(self._sender()),
+            asyncio.create_task(self._receiver()),
+        ]
+
+    def is_alive(self):
+        return self.upstream is not None
+
+    async def close(self):
+        """Ask AssemblyAI to finish the stream, then close the socket."""
+        if self.upstream is None:
+            # upstream already dropped (seen by _receiver): _sender is still
+            # parked on queue.get(), so stop it here instead of leaking it
+            for task in self.tasks:
+                task.cancel()
+            self.tasks = []
+            return
+        upstream = self.upstream
+        try:
+            await asyncio.wait_for(self._drain(), timeout=CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            for task in self.tasks:
+                task.cancel()
+        await upstream.close()
+        self.upstream = None
+
+    async def _drain(self):
+        await self.queue.put({"type": "Terminate"})
+        await self.queue.put(None)
+        await asyncio.gather(*self.tasks)
+
+    # --- Send ---
+    async def send(self, data):
+        """
+        Queue data for this candidate's AssemblyAI stream. Waits (without
+        blocking the loop) while the queue is full.
+        """
+        self.last_used = time.time()
+        if self.upstream is None:
+            print(f"WebSocket connection not established yet (user={self.user_id}).")
+            return False
+        await self.queue.put(data)
+        return True
 
-    if ws_global is None:
-        print("WebSocket connection not established yet.")
-        return False
-    try:
-        if is_binary:
-            ws_global.send(data, websocket.ABNF.OPCODE_BINARY)
-        else:
+    async def _sender(self):
+        while True:
+            data = await self.queue.get()
+            if data is None:
+                break
             if isinstance(data, dict):
                 data = json.dumps(data)
-            ws_global.send(data)
+            upstream = self.upstream
+            if upstream is None:
+                continue  # upstream gone: keep draining so senders never stall
+            try:
+                await upstream.send(data)
+            except ConnectionClosed:
+                continue
+            except Exception as e:
+                print(f"Error sending data to AssemblyAI (user={self.user_id}): {e}")
+
+    async def _receiver(self):
+        try:
+            async for message in self.upstream:
+                self.on_message(message)
+        except ConnectionClosed as e:
+            print(f"\nWebSocket Disconnected (user={self.user_id}): Status={e.code}, Msg={e.reason}")
+        except Exception as e:
+            print(f"\nWebSocket Error (user={self.user_id}): {e}")
+        finally:
+            self.upstream = None
+
+    # --- Push to Client ---
+    def push(self, payload):
+        """
+        Send a JSON message to the candidate's websocket from any thread
+        (e.g. a Flask request) by scheduling it on the websocket loop.
+        """
+        if self.client is None or self.loop is None:
+            return False
+        message = payload if isinstance(payload, (str, bytes)) else json.dumps(payload)
+        future = asyncio.run_coroutine_threadsafe(self.client.send(message), self.loop)
+        future.result(timeout=PUSH_TIMEOUT)
         return True
-    except Exception as e:
-        print(f"Error sending data to AssemblyAI: {e}")
-        return False
-
 
-
-
-def send_msg_to_llm(userid):
+    # --- Upstream Event Handler ---
+    def on_message(self, message):
+        try:
+            data = json.loads(message)
+            msg_type = data.get('type')
+            if msg_type == "Begin":
+                session_id = data.get('id')
+                expires_at = data.get('expires_at')
+            elif msg_type == "Turn":
+                self.transcript = data.get('transcript', '')
+                self.user_prompt += self.transcript
+            elif msg_type == "Termination":
+                audio_duration = data.get('audio_duration_seconds', 0)
+                session_duration = data.get('session_duration_seconds', 0)
+        except json.JSONDecodeError as e:
+            print(f"Error decoding message: {e}")
+        except Exception as e:
+            print(f"Error handling message: {e}")
+
+
+# ---------------- Session Manager ---------------- #
+class STTSessionManager:
     """
-    Flask API to send collected user_prompt to LLM
+    Registry of STT sessions keyed by userId. Sessions are opened and closed
+    on the websocket loop; Flask threads only read them via get().
     """
-    print("llm agent starting process ")
-    global user_prompt, stopmsgtollm, transcript
 
-    # if not user_prompt.strip():
-    #     return jsonify({"error": "No user prompt available"}), 400
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._cleanup_task = None
+
+    def get(self, user_id):
+        with self._lock:
+            return self._sessions.get(user_id)
+
+    async def open(self, user_id, client=None):
+        """Return the candidate's session, (re)connecting its upstream stream if needed."""
+        if self._cleanup_task is None or self._cleanup_task.done():
+            # in the background: closing expired streams must not delay this connect
+            self._cleanup_task = asyncio.create_task(self.cleanup())
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = STTSession(user_id)
+                self._sessions[user_id] = session
+        async with session.open_lock:
+            if not session.is_alive():
+                await session.start()
+        session.client = client
+        session.last_used = time.time()
+        return session
+
+    async def close(self, user_id, client=None):
+        """
+        Close the upstream stream but keep the transcript for send_msg_to_llm.
+        With client, only if that websocket still owns the session: a
+        reconnect may already have attached a newer one.
+        """
+        session = self.get(user_id)
+        if session is None:
+            return
+        if client is not None and session.client is not client:
+            print(f"Stale connection closed for {user_id}; session kept for the new one.")
+            return
+        session.client = None
+        session.last_used = time.time()   # idle from now, not from its last audio frame
+        await session.close()
+
+    async def cleanup(self):
+        """Remove inactive sessions to prevent memory leak"""
+        now = time.time()
+        with self._lock:
+            # a session with a client attached is in use even if muted (send() not called)
+            expired = [uid for uid, s in self._sessions.items()
+                       if s.client is None and now - s.last_used > SESSION_TTL]
+            removed = [self._sessions.pop(uid) for uid in expired]
+        # each close may wait up to CLOSE_TIMEOUT, so run them concurrently
+        await asyncio.gather(*(session.close() for session in removed), return_exceptions=True)
+
+
+sessions = STTSessionManager()
+
+
+def client_user_id(websocket):
+    """Read userId from the connect URL, e.g. ws://host:8001/?userId=abc"""
+    request_info = getattr(websocket, "request", None)
+    path = request_info.path if request_info is not None else getattr(websocket, "path", "")
+    return parse_qs(urlparse(path).query).get("userId", [None])[0]
 
-    # Process with your LLM connection
-    response = get_question_endpoint(transcript,userid)
-    user_prompt = ""
-    blendtextdata = ttsblend(response.get("question"))
-    stopmsgtollm = True
-    return blendtextdata
 
+# --- WebSocket Send Function ---
 
+async def send_to_assemblyai(user_id, data):
+    """
+    Relay data to the candidate's AssemblyAI stream, unless that session is paused.
+    """
+    session = sessions.get(user_id)
+    if session is None:
+        print(f"No STT session for user {user_id}.")
+        return False
+    if session.paused:
+        return False
+    return await session.send(data)
 
 
-# --- WebSocket Event Handlers ---
-def on_open(ws):
-    """Called when the WebSocket connection is established."""
-    print("WebSocket connection opened.")
-    global ws_global
-    ws_global = ws  # Store the ws for use elsewhere
-    # No local microphone capture on backend. Expect frontend to POST/stream audio chunks
-    print("Backend will forward audio received from frontend to AssemblyAI.")
+def resume_session(user_id):
+    """Unmute the candidate now instead of when the question's audio ends."""
+    session = sessions.get(user_id)
+    if session is None:
+        return False
+    session.resume()
+    return True
 
 
-def on_message(ws, message):
-    global user_prompt, transcript
+def _fallback_blend(question, delivery, session, stream_meta):
+    """Whole-question TTS after a failed stream; metadata with the error if that fails too."""
     try:
-        data = json.loads(message)
-        msg_type = data.get('type')
-        if msg_type == "Begin":
-            session_id = data.get('id')
-            expires_at = data.get('expires_at')
-        elif msg_type == "Turn":
-            transcript = data.get('transcript', '')
-            formatted = data.get('turn_is_formatted', False)
-            # Clear previous line for formatted messages
-            if formatted:
-
-                user_prompt+=transcript
-            else:
-                user_prompt += transcript
-        elif msg_type == "Termination":
-            audio_duration = data.get('audio_duration_seconds', 0)
-            session_duration = data.get('session_duration_seconds', 0)
-    except json.JSONDecodeError as e:
-        print(f"Error decoding message: {e}")
+        if delivery == "ws":
+            return {**ttsblend_binary(question, session.push), "fallback": True}
+        return {**synthesize_blend(question, delivery), "fallback": True}
     except Exception as e:
-        print(f"Error handling message: {e}")
+        print(f"❌ Fallback TTS for {session.user_id} failed: {e}")
+        return {**stream_meta, "question": question}
 
 
-def on_error(ws, error):
-    """Called when a WebSocket error occurs."""
-    print(f"\nWebSocket Error: {error}")
-    # Attempt to signal stop on error
-    stop_event.set()
-
-
-def on_close(ws, close_status_code, close_msg):
-    """Called when the WebSocket connection is closed."""
-    print(f"\nWebSocket Disconnected: Status={close_status_code}, Msg={close_msg}")
-    # Ensure background workers are signalled to stop
-    stop_event.set()
-
-    # Clear stored websocket reference
-    global ws_global
-    ws_global = None
-
-
-
-
-# --- Main Execution ---
-def run():
-    global audio, stream, ws_app
-    # Create WebSocketApp
-    ws_app = websocket.WebSocketApp(
-        API_ENDPOINT,
-        header={"Authorization": api_key},
-        on_open=on_open,
-        on_message=on_message,
-        on_error=on_error,
-        on_close=on_close,
-    )
-
-    # Run WebSocketApp in a separate thread to allow main thread to catch KeyboardInterrupt
-    ws_thread = threading.Thread(target=ws_app.run_forever)
-    ws_thread.daemon = True
-    ws_thread.start()
-
-    try:
-        # Keep main thread alive until interrupted
-        while ws_thread.is_alive():
-            time.sleep(0.1)
-    except KeyboardInterrupt:
-        print("\nCtrl+C received. Stopping...")
-        stop_event.set()  # Signal audio thread to stop
-
-        # Send termination message to the server using the new function
-        terminate_message = {"type": "Terminate"}
-        print(f"Sending termination message: {json.dumps(terminate_message)}")
-        send_to_assemblyai(terminate_message)
-
-        # Give a moment for messages to process before forceful close
-        time.sleep(5)
-
-        # Close the WebSocket connection (will trigger on_close)
-        if ws_app:
-            ws_app.close()
-
-        # Wait for WebSocket thread to finish
-        ws_thread.join(timeout=2.0)
+def send_msg_to_llm(userid, stream=False, delivery=None):
+    """
+    Flask API to send the candidate's collected transcript to LLM.
+    With stream=True the question audio is pushed sentence by sentence over
+    the candidate's websocket and only the metadata is returned here.
+    delivery picks how audio travels (see texttospeech.AUDIO_DELIVERY).
+    """
+    print("llm agent starting process ")
+    session = sessions.get(userid)
+    transcript = session.transcript if session else ""
+    delivery = delivery or AUDIO_DELIVERY
+    has_client = session is not None and session.client is not None
+    if delivery == "ws" and not has_client:
+        delivery = "url"
 
-    except Exception as e:
-        print(f"\nAn unexpected error occurred: {e}")
-        stop_event.set()
-        if ws_app:
-            ws_app.close()
-        ws_thread.join(timeout=2.0)
-
-    finally:
-        # Final cleanup (already handled in on_close, but good as a fallback)
-        if stream and stream.is_active():
-            stream.stop_stream()
-        if stream:
-            stream.close()
-        if audio:
-            audio.terminate()
-        print("Cleanup complete. Exiting.")
-
-
-if __name__ == "__main__":
-    run()
\ No newline at end of file
+    # Process with your LLM connection
+    if stream and has_client:
+        # LLM tokens -> sentences -> TTS chunks pushed while the model is still writing
+        tts_stream = TTSSentenceStream(session.push, delivery)
+        try:
+            response = get_question_endpoint(transcript, userid, on_token=tts_stream.feed)
+        finally:
+            # always stop the emitter thread, even if question generation failed;
+            # close() never raises, so it cannot mask the endpoint's own error
+            stream_meta = tts_stream.close()
+        question = response.get("question")
+        if "error" in stream_meta and question:
+            # the question is already committed to the interview state, so it
+            # must still reach the candidate: synthesize it whole instead
+            blendtextdata = _fallback_blend(question, delivery, session, stream_meta)
+        else:
+            blendtextdata = {**stream_meta, "question": question}
+    else:
+        response = get_question_endpoint(transcript, userid)
+        question = response.get("question")
+        if not question:
+            return ttsblend(question, delivery)
+        if delivery == "ws":
+            blendtextdata = ttsblend_binary(question, session.push)
+        else:
+            blendtextdata = synthesize_blend(question, delivery)
+    if session:
+        session.user_prompt = ""
+        # don't transcribe the question while it plays; the pause lifts by
+        # itself afterwards, or earlier if the client calls /reconnect
+        session.pause(blendtextdata.get("duration", 0) + PLAYBACK_GRACE)
+    return jsonify(blendtextdata)
@@ -0,0 +1,111 @@
+import json
+import threading
+from collections import OrderedDict
+
+import redis
+
+from redisclient import redis_client
+
+# ---------------- Config ---------------- #
+SUMMARY_TTL = 86400         # same lifetime as the candidate's question structure
+MEMORY_CACHE_SIZE = 10000
+REDIS_PREFIX = "topic_summary:"
+LATEST_PREFIX = "latest_evaluation:"     # most recent evaluation of any topic, per user
+
+_memory = OrderedDict()     # (user_id, topic) -> summary dict (LRU); (user_id, None) = latest
+_lock = threading.Lock()
+
+
+def _redis_key(user_id, topic):
+    return f"{REDIS_PREFIX}{user_id}:{topic.strip().lower()}"
+
+
+def _remember(key, summary):
+    with _lock:
+        _memory[key] = summary
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+# ---------------- Per-(user, topic) Summary Cache ---------------- #
+def put_summary(user_id, topic, feedback):
+    """Called by EvaluationAgent as soon as a topic is evaluated."""
+    summary = {
+        "topic": topic,
+        "summary": feedback.get("summary", ""),
+        "weak_areas": feedback.get("weak_areas") or [],
+        "score": feedback.get("score"),
+        "next_stage": feedback.get("next_stage"),
+        "next_focus": feedback.get("next_focus"),
+    }
+    _remember((user_id, topic.strip().lower()), summary)
+    _remember((user_id, None), summary)
+    raw = json.dumps(summary)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(_redis_key(user_id, topic), raw, ex=SUMMARY_TTL)
+        pipe.set(LATEST_PREFIX + user_id, raw, ex=SUMMARY_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Summary cache write failed: {e}")
+    return summary
+
+
+def _get(key, redis_key):
+    with _lock:
+        summary = _memory.get(key)
+        if summary is not None:
+            _memory.move_to_end(key)
+            return summary
+    try:
+        raw = redis_client.get(redis_key)
+    except redis.RedisError as e:
+        print(f"⚠️ Summary cache read failed: {e}")
+        return None
+    if not raw:
+        return None
+    summary = json.loads(raw)
+    _remember(key, summary)
+    return summary
+
+
+def get_summary(user_id, topic):
+    """Summary for this candidate and topic, from memory then Redis; None on a miss."""
+    return _get((user_id, topic.strip().lower()), _redis_key(user_id, topic))
+
+
+def get_latest_summary(user_id):
+    """The candidate's most recent topic evaluation, whichever topic it was."""
+    return _get((user_id, None), LATEST_PREFIX + user_id)
+
+
+def get_summary_or_latest(user_id, topic):
+    """
+    get_summary, falling back to the latest summary, with one MGET on a memory
+    miss. The latest comes from Redis (memory only if Redis is down), since
+    another worker may have evaluated since.
+    """
+    topic_key, latest_key = (user_id, topic.strip().lower()), (user_id, None)
+    with _lock:
+        summary = _memory.get(topic_key)
+        if summary is not None:
+            _memory.move_to_end(topic_key)
+            return summary
+    try:
+        raw_topic, raw_latest = redis_client.mget([_redis_key(user_id, topic), LATEST_PREFIX + user_id])
+    except redis.RedisError as e:
+        print(f"⚠️ Summary cache read failed: {e}")
+        with _lock:
+            return _memory.get(latest_key)
+    if raw_topic:
+        summary = json.loads(raw_topic)
+        _remember(topic_key, summary)
+        return summary
+    if not raw_latest:
+        return None
+    # Redis is authoritative here: another worker may have evaluated a topic
+    # since this process last remembered the latest summary
+    summary = json.loads(raw_latest)
+    _remember(latest_key, summary)
+    return summary
@@ -1,58 +1,323 @@
 import io
+import re
 import base64
 import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from flask import Flask, request, jsonify
 from pydub import AudioSegment
 from google.cloud import texttospeech
-from getphenome import generate_phonemes
+from getphenome import generate_blend, generate_phonemes, pack_columns
+import ttscache
 
 
 app = Flask(__name__)
-client = texttospeech.TextToSpeechClient.from_service_account_file("gcpkey.json") ## for development
 
-### for production
-##gcp_key_json = os.getenv("GCP_KEY_JSON")
+# Built on first use (or by warmup), so importing this module needs no credentials
+_client = None
+_client_lock = threading.Lock()
 
-##with open("/tmp/gcpkey.json", "w") as f:
-##    f.write(gcp_key_json)
 
-###client = texttospeech.TextToSpeechClient.from_service_account_file("/tmp/gcpkey.json")
+def get_tts_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = texttospeech.TextToSpeechClient.from_service_account_file("gcpkey.json") ## for development
 
-def ttsblend(text):
-    if not text:
-        return jsonify({"error": "Text is required"}), 400
+                ### for production
+                ##gcp_key_json = os.getenv("GCP_KEY_JSON")
+
+                ##with open("/tmp/gcpkey.json", "w") as f:
+                ##    f.write(gcp_key_json)
+
+                ###_client = texttospeech.TextToSpeechClient.from_service_account_file("/tmp/gcpkey.json")
+    return _client
+
+# ---------------- MP3 Duration (no decode) ---------------- #
+# Bitrate tables in kbps, indexed by the 4-bit bitrate field.
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# version bits -> (table version, sample rates); 0b01 is reserved
+_MP3_VERSIONS = {
+    0b11: (1, [44100, 48000, 32000]),   # MPEG-1
+    0b10: (2, [22050, 24000, 16000]),   # MPEG-2
+    0b00: (2, [11025, 12000, 8000]),    # MPEG-2.5
+}
+
+
+def mp3_duration_seconds(data):
+    """
+    Duration of an MP3 by walking its frame headers (no ffmpeg, no decode).
+    Returns None if the stream does not look like MP3, so callers can fall back.
+    """
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:  # skip ID3v2 tag (syncsafe size)
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    total_samples = 0
+    sample_rate = None
+    first_frame = True
+    end = len(data)
+    while pos + 4 <= end:
+        b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+            pos += 1   # resync on junk between frames
+            continue
+        version_bits, layer_bits = (b1 >> 3) & 0x3, (b1 >> 1) & 0x3
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x3
+        if version_bits not in _MP3_VERSIONS or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+            pos += 1
+            continue
+
+        version, rates = _MP3_VERSIONS[version_bits]
+        layer = 4 - layer_bits
+        bitrate = _MP3_BITRATES[(version, layer)][bitrate_index] * 1000
+        rate = rates[rate_index]
+        padding = (b2 >> 1) & 0x1
+        if layer == 1:
+            samples = 384
+            frame_len = (12 * bitrate // rate + padding) * 4
+        else:
+            samples = 576 if (layer == 3 and version == 2) else 1152
+            frame_len = samples // 8 * bitrate // rate + padding
+
+        # a leading Xing/Info frame is metadata, not audio
+        frame = data[pos:pos + frame_len]
+        if not (first_frame and (b"Xing" in frame or b"Info" in frame)):
+            total_samples += samples
+            sample_rate = rate
+        first_frame = False
+        pos += frame_len
+
+    if not sample_rate:
+        return None
+    return total_samples / sample_rate
+
+
+def audio_duration_seconds(audio_content):
+    """MP3 header walk first; pydub/ffmpeg decode only as a fallback."""
+    duration = mp3_duration_seconds(audio_content)
+    if duration is None:
+        audio = AudioSegment.from_file(io.BytesIO(audio_content), format="mp3")
+        duration = audio.duration_seconds
+    return duration
+
+
+TTS_STREAM_WORKERS = int(os.getenv("TTS_STREAM_WORKERS", "4"))
+_tts_pool = ThreadPoolExecutor(max_workers=TTS_STREAM_WORKERS)
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+VOICE_LANGUAGE = "en-US"
+VOICE_NAME = "en-US-Neural2-D"
+AUDIO_ENCODING = "MP3"
+AUDIO_MIMETYPE = "audio/mpeg"
+
+# How audio reaches the client:
+#   "base64" - inline audioSource in the JSON (legacy)
+#   "url"    - JSON carries audioUrl; bytes served by /audio/<id> with Range support
+#   "ws"     - JSON header + binary frame on the candidate's port 8001 websocket
+AUDIO_DELIVERY = os.getenv("AUDIO_DELIVERY", "base64")
+DELIVERY_MODES = ("base64", "url", "ws")
+
+# blendData shape: "columnar" (parallel JSON arrays), "binary" (base64 of the
+# packed arrays) or "legacy" (the original list of per-phoneme dicts)
+BLEND_FORMAT = os.getenv("BLEND_FORMAT", "columnar")
+
+
+def synthesize(text):
+    """Google TTS + blendData for one piece of text (no Flask objects, safe off-request)."""
+    # 0️⃣ Content-addressed cache: no network call on a hit
+    cached = ttscache.get(text, VOICE_NAME, AUDIO_ENCODING)
+    if cached is not None:
+        return cached
 
     # 1️⃣ Generate audio from Google TTS
     synthesis_input = texttospeech.SynthesisInput(text=text)
     voice = texttospeech.VoiceSelectionParams(
-        language_code="en-US",
-        name="en-US-Neural2-D"
+        language_code=VOICE_LANGUAGE,
+        name=VOICE_NAME
     )
     audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3
+        audio_encoding=texttospeech.AudioEncoding[AUDIO_ENCODING]
     )
 
-    response = client.synthesize_speech(
+    response = get_tts_client().synthesize_speech(
         input=synthesis_input, voice=voice, audio_config=audio_config
     )
-    # 2️⃣ Convert audio bytes to AudioSegment to get duration
-    audio_bytes = io.BytesIO(response.audio_content)
-    audio = AudioSegment.from_file(audio_bytes, format="mp3")
-    duration_seconds = audio.duration_seconds
+    audio_content = response.audio_content
+    # 2️⃣ Get duration from the MP3 frame headers
+    duration_seconds = audio_duration_seconds(audio_content)
 
     # 3️⃣ Generate blendData using your LLM function
-    blendData = generate_phonemes(text , duration_seconds)
+    blendData = generate_blend(text , duration_seconds)
+    key = ttscache.put(text, VOICE_NAME, AUDIO_ENCODING, audio_content, duration_seconds, blendData)
+    return {"key": key, "audio": audio_content, "duration": duration_seconds, "blendData": blendData}
 
-    # 4️⃣ Encode audio to base64 for JSON transport
-    audio_base64 = base64.b64encode(response.audio_content).decode("utf-8")
-    # 5️⃣ Return combined JSON
-    return jsonify({
-        "audioSource": audio_base64,  # frontend can decode base64 to play
-        "blendData": blendData,
-        "duration" : duration_seconds,
+
+def format_blend(text, result, blend_format=None):
+    """Cached blendData is columnar JSON; convert for the requested format."""
+    blend_format = blend_format or BLEND_FORMAT
+    blend = result["blendData"]
+    if blend_format == "legacy":
+        # rebuilt from the text: the columnar form has weighted timing and
+        # folds phonemes outside PHONEME_VOCAB into "?"
+        return generate_phonemes(text, result["duration"])
+    if blend_format == "binary":
+        columns = {k: blend[k] for k in ["time", "phonemeId"] + blend["channels"]}
+        return {
+            "format": "binary",
+            "vocab": blend["vocab"],
+            "data": base64.b64encode(pack_columns(columns)).decode("utf-8"),
+        }
+    return blend
+
+
+def blend_payload(text, result, delivery="base64"):
+    """JSON body for the client; audio inline only in base64 mode."""
+    payload = {
+        "blendData": format_blend(text, result),
+        "duration" : result["duration"],
         "question" : text
-    })
+    }
+    if delivery == "base64":
+        # 4️⃣ Encode audio to base64 for JSON transport
+        payload["audioSource"] = base64.b64encode(result["audio"]).decode("utf-8")  # frontend can decode base64 to play
+    else:
+        payload["audioId"] = result["key"]
+        payload["audioFormat"] = AUDIO_MIMETYPE
+        if delivery == "url":
+            payload["audioUrl"] = f"/audio/{result['key']}"
+    return payload
+
+
+def synthesize_blend(text, delivery="base64"):
+    return blend_payload(text, synthesize(text), delivery)
+
+
+def ttsblend(text, delivery=None):
+    if not text:
+        return jsonify({"error": "Text is required"}), 400
+
+    # 5️⃣ Return combined JSON
+    return jsonify(synthesize_blend(text, delivery or AUDIO_DELIVERY))
+
+
+def ttsblend_binary(text, emit):
+    """
+    "ws" delivery: emit a JSON header ({"type": "audio", ...}) and then the raw
+    audio as one binary frame; returns the metadata-only JSON body.
+    """
+    if not text:
+        return {"error": "Text is required"}
+    result = synthesize(text)
+    payload = blend_payload(text, result, "ws")
+    emit({"type": "audio", "audioId": result["key"], "format": AUDIO_MIMETYPE, "bytes": len(result["audio"])})
+    emit(bytes(result["audio"]))
+    return payload
+
+
+class TTSSentenceStream:
+    """
+    Incremental TTS stage: feed() text as it is produced (e.g. LLM tokens),
+    every completed sentence is synthesized right away on the TTS pool, and an
+    emitter thread calls emit(chunk) in order as soon as each one is ready.
+    In "ws" delivery each chunk header is followed by its audio as a binary frame.
+    close() flushes the tail, sends a terminal {"type": "ttsEnd"} frame (or
+    {"type": "ttsError"} if a chunk failed) and returns the metadata; it does
+    not raise, a failure is reported as "error" in the metadata instead.
+    """
+
+    def __init__(self, emit, delivery="base64"):
+        self.emit = emit
+        self.delivery = delivery
+        self.sentences = []
+        self.duration = 0.0
+        self.error = None
+        self._buffer = ""
+        self._queue = queue.Queue()
+        self._emitter = threading.Thread(target=self._emit_loop, daemon=True)
+        self._emitter.start()
+
+    def feed(self, text):
+        if not self.sentences and not self._buffer and text.strip():
+            # a whole question arriving at once (e.g. prefetched) may already be
+            # cached as one clip; speak that instead of re-synthesizing per sentence
+            cached = ttscache.get(text.strip(), VOICE_NAME, AUDIO_ENCODING)
+            if cached is not None:
+                self._submit(text, cached)
+                return
+        self._buffer += text
+        parts = SENTENCE_PATTERN.split(self._buffer)
+        for sentence in parts[:-1]:
+            self._submit(sentence)
+        self._buffer = parts[-1]
+
+    def close(self):
+        self._submit(self._buffer)
+        self._buffer = ""
+        self._queue.put(None)
+        self._emitter.join()
+        meta = {
+            "question": " ".join(self.sentences),
+            "chunks": len(self.sentences),
+            "duration": self.duration,
+            "streamed": True
+        }
+        if self.error is not None:
+            meta["error"] = str(self.error)
+        try:
+            self.emit({
+                "type": "ttsError" if self.error is not None else "ttsEnd",
+                **{k: v for k, v in meta.items() if k in ("chunks", "duration", "error")}
+            })
+        except Exception as e:
+            print(f"❌ TTS stream end frame failed: {e}")
+        return meta
+
+    def _submit(self, sentence, result=None):
+        sentence = sentence.strip()
+        if not sentence:
+            return
+        index = len(self.sentences)
+        self.sentences.append(sentence)
+        if result is None:
+            future = _tts_pool.submit(synthesize, sentence)
+        else:
+            future = Future()
+            future.set_result(result)
+        self._queue.put((index, sentence, future))
+
+    def _emit_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue   # keep draining so close() returns
+            index, sentence, future = item
+            try:
+                result = future.result()
+                chunk = blend_payload(sentence, result, self.delivery)
+                chunk.update({"type": "ttsChunk", "index": index, "offset": self.duration})
+                self.emit(chunk)
+                if self.delivery == "ws":
+                    self.emit(bytes(result["audio"]))
+                self.duration += chunk["duration"]
+            except Exception as e:
+                print(f"❌ TTS stream chunk {index} failed: {e}")
+                self.error = e
 
 if __name__ == "__main__":
     app.run(port=3001, debug=True)
@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import mmap
+import hashlib
+import tempfile
+import threading
+import redis
+from dotenv import load_dotenv
+
+from redisclient import redis_client
+
+load_dotenv()
+
+# ---------------- Config ---------------- #
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".tts_cache")
+TTS_CACHE_TTL = int(os.getenv("TTS_CACHE_TTL", str(30 * 86400)))   # index entries live 30 days
+CACHE_VERSION = "2"     # bump when the stored audio/blendData format changes
+REDIS_PREFIX = "tts_cache:"
+
+# put() of one key writes audio + sidecar as a pair; striped locks keep two
+# threads of this process (request, TTS pool, prefetch, warmup) from mixing them
+_write_locks = [threading.Lock() for _ in range(64)]
+
+
+# ---------------- Content-addressed TTS Cache ---------------- #
+def cache_key(text, voice, encoding):
+    raw = f"{CACHE_VERSION}\x00{voice}\x00{encoding}\x00{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def audio_path(key):
+    return os.path.join(TTS_CACHE_DIR, key[:2], key + ".audio")
+
+
+def _meta_path(key):
+    return os.path.join(TTS_CACHE_DIR, key[:2], key + ".json")
+
+
+def _read_audio(path):
+    """Memory-map the cached audio; pages come straight from the OS page cache."""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # unique temp name per write, so concurrent writers never share one
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def get(text, voice, encoding):
+    """
+    Return {"key", "audio", "duration", "blendData"} for a cached synthesis, or None.
+    Metadata comes from the shared Redis index (local sidecar if Redis is down);
+    audio is memory-mapped from local disk.
+    """
+    key = cache_key(text, voice, encoding)
+    path = audio_path(key)
+    if not os.path.exists(path):
+        return None
+
+    meta = None
+    try:
+        raw = redis_client.get(REDIS_PREFIX + key)
+        meta = json.loads(raw) if raw else None
+    except redis.RedisError as e:
+        print(f"⚠️ TTS cache index unavailable: {e}")
+    if meta is None:
+        try:
+            with open(_meta_path(key), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    try:
+        audio = _read_audio(path)
+    except (OSError, ValueError):
+        return None
+    return {"key": key, "audio": audio, "duration": meta["duration"], "blendData": meta["blendData"]}
+
+
+def put(text, voice, encoding, audio_content, duration, blend_data):
+    """Store audio on disk and index its metadata in Redis for every worker."""
+    key = cache_key(text, voice, encoding)
+    meta = json.dumps({"duration": duration, "blendData": blend_data})
+    try:
+        with _write_locks[int(key[:2], 16) % len(_write_locks)]:
+            _write_atomic(audio_path(key), audio_content)
+            _write_atomic(_meta_path(key), meta.encode("utf-8"))
+    except OSError as e:
+        print(f"⚠️ TTS cache write failed: {e}")
+        return key
+    try:
+        redis_client.set(REDIS_PREFIX + key, meta, ex=TTS_CACHE_TTL)
+    except redis.RedisError as e:
+        print(f"⚠️ TTS cache index unavailable: {e}")
+    return key
+
+
+# ---------------- Warmup ---------------- #
+def static_prompts(questions_file="questions.json"):
+    """Canned prompts that are spoken verbatim: the fixed openers and the closing message."""
+    from questionagent import INTERVIEW_COMPLETED
+
+    prompts = [INTERVIEW_COMPLETED]
+    try:
+        with open(questions_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        prompts += [q["question"] for q in data.get("generatedQuestions", []) if q.get("question")]
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read {questions_file}: {e}")
+    return list(dict.fromkeys(prompts))
+
+
+def warmup(prompts=None):
+    """Pre-synthesize prompts so their first use is a cache hit."""
+    from texttospeech import synthesize
+
+    prompts = prompts if prompts is not None else static_prompts()
+    for text in prompts:
+        synthesize(text)
+        print(f"✅ cached: {text[:60]}")
+    return len(prompts)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "warmup":
+        print("usage: python ttscache.py warmup [questions.json]")
+        sys.exit(1)
+    warmup(static_prompts(*sys.argv[2:3]))
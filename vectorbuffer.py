@@ -0,0 +1,180 @@
+import time
+import queue
+import atexit
+import threading
+
+from embeddings import embedding_service
+
+# ---------------- Config ---------------- #
+FLUSH_SIZE = 50            # upsert as soon as this many vectors are waiting
+FLUSH_INTERVAL = 1.0       # ...or when the oldest waiting vector is this old (seconds)
+MAX_QUEUE = 10000          # bounded: beyond this, add() drops instead of growing memory
+ENQUEUE_TIMEOUT = 0.05     # never hold the request path longer than this
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5        # seconds, doubled per attempt
+MAX_REQUEUES = 3           # failed vectors go back in the buffer this many times
+
+
+# ---------------- Write-behind Vector Buffer ---------------- #
+class VectorWriteBehind:
+    """
+    Collects vectors off the request path and upserts them in batches.
+
+    Items are Pinecone-style dicts ({"id", "values", "metadata"}). An item may
+    carry "text" instead of "values"; it is then embedded by the flusher, so
+    the caller does not wait on the embedding either.
+
+    index may also be a zero-argument callable returning the index; it is
+    then resolved on the first flush instead of at construction.
+    """
+
+    def __init__(self, index, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE):
+        self._index = index
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    @property
+    def index(self):
+        if callable(self._index):
+            self._index = self._index()
+        return self._index
+
+    def _ensure_worker(self):
+        # started on first add, so a pre-fork import leaves no dead thread behind
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+
+    # --- Public API ---
+    def add(self, vector, namespace=""):
+        self._ensure_worker()
+        try:
+            self._queue.put((namespace, vector, 0), timeout=ENQUEUE_TIMEOUT)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"⚠️ Vector buffer full, dropped {vector.get('id')} ({self.dropped} dropped so far)")
+            return False
+
+    def flush(self):
+        """Block until everything queued so far has been written (or given up on)."""
+        self._queue.join()
+
+    def close(self):
+        """Flush remaining vectors and stop the worker (called at interpreter exit)."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+    # --- Worker ---
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.flush_size:
+                timeout = 0 if self._stop.is_set() else deadline - time.time()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        # latest write per (namespace, id) wins, e.g. a re-evaluated topic summary
+        by_namespace = {}
+        for namespace, vector, requeues in batch:
+            by_namespace.setdefault(namespace, {})[vector["id"]] = (vector, requeues)
+
+        for namespace, items in by_namespace.items():
+            # each vector is embedded on its own future, so one bad text only
+            # holds back its own vector and the rest are still upserted
+            not_embedded = self._embed_missing(list(items.values()))
+            ready = [(vector, requeues) for vector, requeues in items.values() if "values" in vector]
+            vectors = [vector for vector, _ in ready]
+            if vectors:
+                if self._with_retry(lambda: self._upsert(vectors, namespace), f"Upsert of {len(vectors)} vectors"):
+                    print(f"✅ Upserted {len(vectors)} buffered vectors")
+                else:
+                    not_embedded += ready
+            if not_embedded:
+                self._requeue(namespace, not_embedded)
+
+    @staticmethod
+    def _with_retry(step, what):
+        delay = RETRY_BACKOFF
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                step()
+                return True
+            except Exception as e:
+                print(f"⚠️ {what}: attempt {attempt}/{MAX_RETRIES} failed: {e}")
+                if attempt < MAX_RETRIES:
+                    time.sleep(delay)
+                    delay *= 2
+        return False
+
+    def _requeue(self, namespace, items):
+        """Put failed vectors back for a later flush, up to MAX_REQUEUES times each."""
+        given_up = []
+        for vector, requeues in items:
+            if requeues >= MAX_REQUEUES:
+                given_up.append(vector["id"])
+                continue
+            try:
+                self._queue.put_nowait((namespace, vector, requeues + 1))
+            except queue.Full:
+                given_up.append(vector["id"])
+        if given_up:
+            self.dropped += len(given_up)
+            print(f"❌ Gave up on {len(given_up)} vectors: {given_up}")
+
+    @staticmethod
+    def _embed_missing(items):
+        """Embed (vector, requeues) items that carry "text"; returns those still without values."""
+        pending = [item for item in items if "values" not in item[0]]
+        delay = RETRY_BACKOFF
+        for attempt in range(1, MAX_RETRIES + 1):
+            if not pending:
+                break
+            futures = embedding_service.submit_many([vector["text"] for vector, _ in pending])
+            failed, error = [], None
+            for item, future in zip(pending, futures):
+                try:
+                    values = future.result()
+                except Exception as e:
+                    failed.append(item)
+                    error = e
+                    continue
+                # "text" is only dropped once embedded, so a failed vector can be retried
+                item[0]["values"] = values.tolist()
+                item[0].pop("text")
+            pending = failed
+            if pending:
+                print(f"⚠️ Embedding of {len(pending)} vectors: attempt {attempt}/{MAX_RETRIES} failed: {error}")
+                if attempt < MAX_RETRIES:
+                    time.sleep(delay)
+                    delay *= 2
+        return pending
+
+    def _upsert(self, vectors, namespace):
+        if namespace:
+            self.index.upsert(vectors=vectors, namespace=namespace)
+        else:
+            self.index.upsert(vectors=vectors)
@@ -0,0 +1,293 @@
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from embeddings import EMBEDDING_DIM
+
+load_dotenv()
+
+# ---------------- Config ---------------- #
+# "pinecone" (remote, default) or "local" (in-process NumPy index)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+INDEX_NAME = "topic-summary"
+
+
+# ---------------- Query Results (Pinecone-shaped) ---------------- #
+class Match:
+    def __init__(self, id, score, metadata=None, values=None):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+        self.values = values
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+class QueryResult:
+    def __init__(self, matches, namespace=""):
+        self.matches = matches
+        self.namespace = namespace
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+# ---------------- Metadata Filters ---------------- #
+def _compare(value, op, operand):
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if op == "$exists":
+        return (value is not None) == bool(operand)
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def matches_filter(metadata, flt):
+    """Pinecone metadata filter semantics ($eq, $in, $gt, $and, $or, ...)."""
+    for field, cond in flt.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, sub) for sub in cond):
+                return False
+        elif field == "$or":
+            if not any(matches_filter(metadata, sub) for sub in cond):
+                return False
+        else:
+            value = metadata.get(field)
+            ops = cond if isinstance(cond, dict) else {"$eq": cond}
+            for op, operand in ops.items():
+                # list-valued metadata matches if any element does
+                if isinstance(value, list) and op in ("$eq", "$in"):
+                    hit = any(_compare(v, op, operand) for v in value)
+                else:
+                    hit = _compare(value, op, operand)
+                if not hit:
+                    return False
+    return True
+
+
+def _equality_terms(flt):
+    """(field, value) pairs that every match must have, for the postings fast path."""
+    terms = []
+    for field, cond in flt.items():
+        if field.startswith("$"):
+            continue
+        if not isinstance(cond, dict):
+            terms.append((field, cond))
+        elif "$eq" in cond:
+            terms.append((field, cond["$eq"]))
+    return terms
+
+
+def _hashable(value):
+    return isinstance(value, (str, int, float, bool))
+
+
+# ---------------- Local Index ---------------- #
+class _Namespace:
+    def __init__(self, dim):
+        self.matrix = np.zeros((64, dim), dtype=np.float32)   # unit-normalized rows
+        self.ids = []
+        self.metadata = []
+        self.rows = {}                      # id -> row
+        self.postings = {}                  # (field, value) -> set(rows)
+        self.live = np.zeros(64, dtype=bool)
+
+    def _grow(self):
+        capacity = len(self.matrix) * 2
+        matrix = np.zeros((capacity, self.matrix.shape[1]), dtype=np.float32)
+        matrix[:len(self.matrix)] = self.matrix
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self.live)] = self.live
+        self.matrix, self.live = matrix, live
+
+    def _index_metadata(self, row, metadata, add):
+        for field, value in metadata.items():
+            for v in (value if isinstance(value, list) else [value]):
+                if not _hashable(v):
+                    continue
+                bucket = self.postings.setdefault((field, v), set())
+                if add:
+                    bucket.add(row)
+                else:
+                    bucket.discard(row)
+
+    def upsert(self, vid, values, metadata):
+        row = self.rows.get(vid)
+        if row is None:
+            row = len(self.ids)
+            if row >= len(self.matrix):
+                self._grow()
+            self.ids.append(vid)
+            self.metadata.append({})
+            self.rows[vid] = row
+        else:
+            self._index_metadata(row, self.metadata[row], add=False)
+        vector = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        self.matrix[row] = vector / norm if norm else vector
+        self.metadata[row] = metadata
+        self.live[row] = True
+        self._index_metadata(row, metadata, add=True)
+
+    def delete(self, vid):
+        row = self.rows.pop(vid, None)
+        if row is not None:
+            self._index_metadata(row, self.metadata[row], add=False)
+            self.live[row] = False
+            self.metadata[row] = {}
+
+    def candidates(self, flt):
+        n = len(self.ids)
+        if not flt:
+            return np.flatnonzero(self.live[:n])
+        rows = None
+        for term in _equality_terms(flt):
+            posting = self.postings.get(term, set()) if _hashable(term[1]) else None
+            if posting is not None:
+                rows = posting if rows is None else rows & posting
+        if rows is None:
+            rows = np.flatnonzero(self.live[:n])
+        return np.fromiter(
+            (r for r in sorted(rows) if self.live[r] and matches_filter(self.metadata[r], flt)),
+            dtype=np.int64
+        )
+
+
+class LocalIndex:
+    """
+    In-process drop-in for pinecone's Index: upsert / query / delete with
+    namespaces and metadata filters. Brute-force cosine over a NumPy matrix,
+    which stays sub-millisecond at the size of a single deployment.
+    """
+
+    def __init__(self, dimension=EMBEDDING_DIM):
+        self.dimension = dimension
+        self._namespaces = {}
+        self._lock = threading.RLock()
+
+    def _ns(self, namespace):
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            ns = self._namespaces[namespace] = _Namespace(self.dimension)
+        return ns
+
+    def upsert(self, vectors, namespace=""):
+        with self._lock:
+            ns = self._ns(namespace)
+            for v in vectors:
+                if isinstance(v, dict):
+                    vid, values, metadata = v["id"], v["values"], v.get("metadata") or {}
+                else:
+                    vid, values, metadata = v[0], v[1], (v[2] if len(v) > 2 else {})
+                ns.upsert(vid, values, dict(metadata))
+            return {"upserted_count": len(vectors)}
+
+    def delete(self, ids=None, namespace="", delete_all=False):
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace, None)
+                return {}
+            ns = self._ns(namespace)
+            for vid in ids or []:
+                ns.delete(vid)
+            return {}
+
+    def query(self, vector=None, top_k=10, filter=None, include_metadata=False,
+              include_values=False, namespace="", id=None):
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                return QueryResult([], namespace)
+            if vector is None and id is not None:
+                vector = ns.matrix[ns.rows[id]]
+            q = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(q)
+            if norm:
+                q = q / norm
+
+            n = len(ns.ids)
+            if not filter and len(ns.rows) == n:
+                # no filter, no deletions: score the matrix slice in place (no gather copy)
+                rows = np.arange(n)
+                scores = ns.matrix[:n] @ q
+            else:
+                rows = ns.candidates(filter)
+                scores = ns.matrix[rows] @ q
+            if len(rows) == 0:
+                return QueryResult([], namespace)
+            k = min(top_k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            matches = []
+            for i in top:
+                r = rows[i]
+                matches.append(Match(
+                    id=ns.ids[r],
+                    score=float(scores[i]),
+                    metadata=dict(ns.metadata[r]) if include_metadata else None,
+                    values=ns.matrix[r].tolist() if include_values else None,
+                ))
+            return QueryResult(matches, namespace)
+
+    def describe_index_stats(self):
+        with self._lock:
+            namespaces = {name: {"vector_count": len(ns.rows)} for name, ns in self._namespaces.items()}
+            return {
+                "dimension": self.dimension,
+                "namespaces": namespaces,
+                "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+            }
+
+
+# ---------------- Backend Selection ---------------- #
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _pinecone_index(name, dimension):
+    from pinecone import Pinecone, ServerlessSpec
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_API"))
+    # Create index if it does not exist
+    if name not in [idx["name"] for idx in pc.list_indexes()]:
+        pc.create_index(
+            name=name,
+            dimension=dimension,  # 1024 dimensions for text-embedding-3-small
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+    return pc.Index(name)
+
+
+def get_index(name=INDEX_NAME, backend=None, dimension=EMBEDDING_DIM):
+    """Shared index handle for the configured backend (one per name per process)."""
+    backend = backend or VECTOR_BACKEND
+    with _indexes_lock:
+        key = (backend, name)
+        if key not in _indexes:
+            if backend == "local":
+                _indexes[key] = LocalIndex(dimension)
+            elif backend == "pinecone":
+                _indexes[key] = _pinecone_index(name, dimension)
+            else:
+                raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+        return _indexes[key]
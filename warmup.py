@@ -0,0 +1,41 @@
+import os
+import time
+
+from redisclient import redis_client
+from extractresume import get_llm
+from llmconnection import get_chat_chain
+from texttospeech import get_tts_client
+from getphenome import phonemize_text
+from vectorstore import get_index, INDEX_NAME
+
+# ---------------- Config ---------------- #
+WORKER_WARMUP = os.getenv("WORKER_WARMUP", "true").lower() == "true"
+
+# Every external client is created lazily on first use; this just makes that
+# first use happen before the first candidate does. Order: cheap and local first.
+WARMUP_STEPS = [
+    ("redis", lambda: redis_client.ping()),
+    ("resume llm", get_llm),
+    ("chat chain", get_chat_chain),
+    ("gcp tts", get_tts_client),
+    ("espeak", lambda: phonemize_text("warm up")),
+    ("vector index", lambda: get_index(INDEX_NAME)),
+]
+
+
+def warmup(steps=WARMUP_STEPS):
+    """
+    Initialize each client once and report how long it took. A failing service
+    is logged, not raised: the worker still boots and retries on first use.
+    """
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+            timings[name] = time.perf_counter() - start
+            print(f"🔥 Warmed {name} in {timings[name] * 1000:.0f} ms")
+        except Exception as e:
+            timings[name] = None
+            print(f"⚠️ Warmup of {name} failed ({e}); it will be retried on first use")
+    return timings